@@ -4,6 +4,8 @@ Base agent configuration for the SDLC workflow.
 from agno.agent import Agent
 from agno.models.openai import OpenAIChat
 from storage.csv_storage import CSVAgentStorage
+from storage.sqlite_storage import SQLiteAgentStorage
+from storage.shared_log import SharedLogAgentStorage
 
 def create_base_agent(
     name: str,
@@ -12,7 +14,8 @@ def create_base_agent(
     model_id: str = "gpt-4o",
     tools: list = None,
     knowledge = None,
-    storage_dir: str = "storage/csv",
+    storage_dir: str = None,
+    backend: str = "csv",
 ):
     """
     Create a base agent with common configuration.
@@ -24,7 +27,9 @@ def create_base_agent(
         model_id: Model ID to use
         tools: List of tools for the agent
         knowledge: Knowledge base for the agent
-        storage_dir: Directory for CSV storage
+        storage_dir: Directory for agent session storage (defaults to storage/sqlite for the
+            "sqlite" backend and storage/csv otherwise)
+        backend: Session storage backend, "csv", "sqlite" or "shared"
 
     Returns:
         Configured Agent instance
@@ -32,11 +37,16 @@ def create_base_agent(
     # Create model (currently supporting OpenAI only)
     model = OpenAIChat(id=model_id)
 
-    # Create CSV storage
-    storage = CSVAgentStorage(
-        table_name=name.lower().replace(" ", "_"),
-        csv_dir=storage_dir
-    )
+    # Create session storage
+    table_name = name.lower().replace(" ", "_")
+    if backend == "csv":
+        storage = CSVAgentStorage(table_name=table_name, csv_dir=storage_dir or "storage/csv")
+    elif backend == "sqlite":
+        storage = SQLiteAgentStorage(table_name=table_name, db_dir=storage_dir or "storage/sqlite")
+    elif backend == "shared":
+        storage = SharedLogAgentStorage(table_name=table_name, log_dir=storage_dir or "storage/csv")
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
 
     # Create and return the agent
     return Agent(
@@ -0,0 +1,247 @@
+"""
+Approximate nearest neighbour index types for the knowledge base.
+"""
+import math
+import time
+import argparse
+import faiss
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "auto")
+
+# Below this many vectors a brute-force search is fast enough
+FLAT_MAX_VECTORS = 50000
+
+# Upper bound on the number of vectors to train IVF and PQ quantizers on
+MAX_TRAIN_SIZE = 100000
+
+# Graph degree of HNSW indexes
+HNSW_M = 32
+
+
+def choose_index_type(num_vectors: int, dimension: int, memory_budget_mb: float) -> str:
+    """
+    Pick an index type for the "auto" mode.
+
+    Small corpora use an exact flat index. Larger ones use IVF-Flat when
+    the raw vectors fit in the memory budget and IVF-PQ, which stores
+    compressed codes, when they do not. HNSW is never picked automatically,
+    as it cannot remove vectors and every incremental update that changes
+    a file would rebuild it.
+
+    Args:
+        num_vectors: Number of vectors to index
+        dimension: Vector dimension
+        memory_budget_mb: Memory the index may use, in megabytes
+
+    Returns:
+        "flat", "ivf_flat" or "ivf_pq"
+    """
+    if num_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors * (4 * dimension + 8) <= memory_budget_mb * 2 ** 20:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def plan_index(index_type: str, num_vectors: int, dimension: int,
+               memory_budget_mb: float = 1024) -> Tuple[str, str, int]:
+    """
+    Work out the FAISS index to build.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        num_vectors: Expected number of vectors
+        dimension: Vector dimension
+        memory_budget_mb: Memory budget for the "auto" mode, in megabytes
+
+    Returns:
+        The resolved index type, its FAISS factory string and the number of vectors to train it on
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Expected one of {', '.join(INDEX_TYPES)}")
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors, dimension, memory_budget_mb)
+
+    if index_type == "flat":
+        return index_type, "Flat", 0
+    if index_type == "hnsw":
+        return index_type, f"HNSW{HNSW_M}", 0
+
+    # About 4 * sqrt(n) lists, with at least 39 training vectors per list
+    nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+    train_size = 39 * nlist
+    spec = f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        # Sub-quantizers must divide the dimension; codes use up to 8 bits, with 39 training vectors per centroid
+        m = next(m for m in (64, 32, 16, 8, 4, 2, 1) if dimension % m == 0 and m <= dimension)
+        nbits = max(1, min(8, int(math.log2(max(num_vectors // 39, 2)))))
+        train_size = max(train_size, 39 * 2 ** nbits)
+        spec = f"IVF{nlist},PQ{m}x{nbits}"
+    return index_type, spec, min(train_size, MAX_TRAIN_SIZE, num_vectors)
+
+
+def create_index(spec: str, dimension: int) -> faiss.Index:
+    """
+    Create an empty index that stores vectors under explicit IDs.
+
+    IVF indexes keep IDs in their inverted lists. Other indexes are wrapped
+    in an IndexIDMap2, which would mismatch IDs on removal from an IVF
+    index, as it expects removal to shift the positions of later vectors.
+
+    Args:
+        spec: FAISS factory string from plan_index()
+        dimension: Vector dimension
+
+    Returns:
+        The index
+    """
+    if spec.startswith("IVF"):
+        return faiss.index_factory(dimension, spec)
+    return faiss.index_factory(dimension, "IDMap2," + spec)
+
+
+def has_ids(index: faiss.Index) -> bool:
+    """Check whether an index stores vectors under explicit IDs."""
+    return isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def _inner(index: faiss.Index) -> faiss.Index:
+    """Unwrap an IndexIDMap2 to the index it maps IDs for."""
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """
+    Set the speed/recall trade-off of an index.
+
+    Args:
+        index: Index to configure
+        nprobe: Number of IVF lists to visit per query
+        ef_search: Size of the HNSW candidate list per query
+    """
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexIVF) and nprobe is not None:
+        inner.nprobe = min(nprobe, inner.nlist)
+    if isinstance(inner, faiss.IndexHNSW) and ef_search is not None:
+        inner.hnsw.efSearch = ef_search
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """Check whether vectors can be removed from an index."""
+    return not isinstance(_inner(index), faiss.IndexHNSW)
+
+
+def _search_settings(index: faiss.Index) -> List[Tuple[str, Dict[str, int]]]:
+    """List the search parameter values to sweep for an index."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexIVF):
+        values = [n for n in (1, 2, 4, 8, 16, 32, 64, 128, 256) if n < inner.nlist] + [inner.nlist]
+        return [(f"nprobe={n}", {"nprobe": n}) for n in values]
+    if isinstance(inner, faiss.IndexHNSW):
+        return [(f"efSearch={n}", {"ef_search": n}) for n in (16, 32, 64, 128, 256)]
+    return [("exact", {})]
+
+
+def _time_search(index: faiss.Index, queries: np.ndarray, k: int) -> Tuple[np.ndarray, List[float]]:
+    """Run queries one at a time, returning the result IDs and per-query latencies in milliseconds."""
+    ids, latencies = [], []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, row = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(row[0])
+    return np.array(ids), latencies
+
+
+def recall_report(index: faiss.Index, vectors: np.ndarray, ids: np.ndarray,
+                  queries: np.ndarray, k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Compare the recall and latency of an index with an exact flat search.
+
+    The index's search parameters are swept (nprobe for IVF, efSearch for
+    HNSW) and restored afterwards.
+
+    Args:
+        index: Index to evaluate
+        vectors: Exact vectors of the indexed chunks
+        ids: Vector ID of each row of vectors
+        queries: Query vectors
+        k: Number of neighbours per query
+
+    Returns:
+        One row per setting, with recall@k and mean and p95 latency in milliseconds,
+        preceded by the flat baseline
+    """
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    baseline = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+    baseline.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    truth, latencies = _time_search(baseline, queries, k)
+
+    # A hit is any result at most as far as the k-th true neighbour, so ties at that distance count
+    rows = {vector_id: row for row, vector_id in enumerate(np.asarray(ids).tolist())}
+    expected = (truth >= 0).sum(axis=1)
+    kth_distance = np.array([
+        ((vectors[rows[found[n - 1]]] - query) ** 2).sum() if n else -1.0
+        for query, found, n in zip(queries, truth, expected)
+    ])
+
+    def row(label, setting, found, latencies):
+        hits = 0
+        for query, result, limit, n in zip(queries, found, kth_distance, expected):
+            result = [rows[vector_id] for vector_id in result.tolist() if vector_id in rows]
+            distances = ((vectors[result] - query) ** 2).sum(axis=1)
+            hits += min(int((distances <= limit * (1 + 1e-5) + 1e-6).sum()), n)
+        return {
+            "index": label,
+            "setting": setting,
+            "recall": hits / max(int(expected.sum()), 1),
+            "mean_ms": float(np.mean(latencies)),
+            "p95_ms": float(np.percentile(latencies, 95))
+        }
+
+    results = [row("flat (baseline)", "exact", truth, latencies)]
+    inner = _inner(index)
+    saved = {"nprobe": getattr(inner, "nprobe", None),
+             "ef_search": inner.hnsw.efSearch if isinstance(inner, faiss.IndexHNSW) else None}
+    label = type(inner).__name__
+    try:
+        for setting, params in _search_settings(index):
+            set_search_params(index, **params)
+            found, latencies = _time_search(index, queries, k)
+            results.append(row(label, setting, found, latencies))
+    finally:
+        set_search_params(index, **saved)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    from knowledge.loaders import FAISSKnowledgeBase
+    from knowledge.fake_embedder import FakeEmbedder
+
+    parser = argparse.ArgumentParser(description="Report recall and latency of a knowledge base index")
+    parser.add_argument("docs_path", help="Knowledge base documents directory")
+    parser.add_argument("--index-path", help="Index path (defaults to docs_path/index.faiss)")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--queries", type=int, default=100, help="Number of indexed chunks to use as queries")
+    parser.add_argument("--fake-embedder", action="store_true", help="Use the offline fake embedder")
+    args = parser.parse_args(argv)
+
+    knowledge_base = FAISSKnowledgeBase(
+        args.docs_path,
+        index_path=args.index_path,
+        embedder=FakeEmbedder() if args.fake_embedder else None
+    )
+    knowledge_base.load_index()
+
+    print(f"{'index':<24}{'setting':<16}{'recall':>8}{'mean ms':>10}{'p95 ms':>10}")
+    for result in knowledge_base.recall_report(k=args.k, num_queries=args.queries):
+        print(f"{result['index']:<24}{result['setting']:<16}{result['recall']:>8.3f}"
+              f"{result['mean_ms']:>10.3f}{result['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
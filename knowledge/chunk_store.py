@@ -0,0 +1,213 @@
+"""
+Memory-mapped store of knowledge base chunks, aligned with the FAISS index.
+"""
+import os
+import json
+import mmap
+import uuid
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+
+# Columns of the chunk table
+VECTOR_ID, OFFSET, LENGTH, SOURCE, CHUNK = range(5)
+
+
+class ChunkStore:
+    """
+    Holds the text and metadata of every indexed chunk.
+
+    The store is three files next to the index:
+
+    - ``<base>.chunks.<version>``: the UTF-8 text of the chunks, back to back
+    - ``<base>.chunks.<version>.npy``: an int64 table with one row per chunk
+      (vector ID, text offset, text length, source number, chunk number),
+      sorted by vector ID
+    - ``<base>.chunks.json``: the version stamp, the names of the current
+      text and table files, the source file paths and the used length of
+      the text buffer
+
+    The table and text are memory-mapped, so opening the store reads only
+    the small JSON file and looking up a hit pages in just its row and
+    text. Every save writes a new table and replaces the JSON file last,
+    so an interrupted save leaves the previous version intact. New text is
+    appended to the buffer; once most of the buffer belongs to removed
+    chunks, it is rewritten to a new file with only the live ones.
+    """
+    def __init__(self, base: str):
+        """
+        Initialize an empty chunk store.
+
+        Args:
+            base: Path prefix of the store files, normally the index path
+        """
+        self.base = base
+        self.meta_path = base + ".chunks.json"
+        self.text_path: Optional[str] = None
+        self.table_path: Optional[str] = None
+
+        self.version: Optional[str] = None
+        self.sources: List[str] = []
+        self._table = np.zeros((0, 5), dtype='int64')
+        self._text = b""
+        self._text_size = 0
+
+    @classmethod
+    def open(cls, base: str) -> Optional["ChunkStore"]:
+        """
+        Open a saved chunk store.
+
+        Args:
+            base: Path prefix of the store files
+
+        Returns:
+            The store, or None if it has not been saved
+        """
+        store = cls(base)
+        try:
+            with open(store.meta_path, 'r') as f:
+                store._open_version(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+        return store
+
+    def _open_version(self, meta: Dict[str, Any]) -> None:
+        """Map the files of a saved version."""
+        directory = os.path.dirname(self.base)
+        self.text_path = os.path.join(directory, meta['text'])
+        self.table_path = os.path.join(directory, meta['table'])
+        self._table = np.load(self.table_path, mmap_mode='r')
+        self.version = meta['version']
+        self.sources = meta['sources']
+        self._text_size = meta['text_size']
+
+        self._text = b""
+        if self._text_size:
+            with open(self.text_path, 'rb') as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    @property
+    def vector_ids(self) -> np.ndarray:
+        """Vector IDs of the stored chunks, in ascending order."""
+        return self._table[:, VECTOR_ID]
+
+    def rows_for(self, vector_ids: Sequence[int]) -> np.ndarray:
+        """
+        Find the table rows of vector IDs.
+
+        Args:
+            vector_ids: Vector IDs to look up
+
+        Returns:
+            Row of each ID, or -1 where the ID is not stored
+        """
+        vector_ids = np.asarray(vector_ids, dtype='int64')
+        if not len(self):
+            return np.full(len(vector_ids), -1, dtype='int64')
+        rows = np.minimum(np.searchsorted(self.vector_ids, vector_ids), len(self) - 1)
+        return np.where(self.vector_ids[rows] == vector_ids, rows, -1)
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """
+        Read the chunk at a table row.
+
+        Args:
+            row: Table row
+
+        Returns:
+            The chunk as a document
+        """
+        vector_id, offset, length, source, chunk = (int(value) for value in self._table[row])
+        source_path = self.sources[source]
+        return {
+            'id': f"{os.path.basename(source_path)}-{chunk}",
+            'source': source_path,
+            'content': self._text[offset:offset + length].decode('utf-8'),
+            'vector_id': vector_id
+        }
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Read every chunk, in vector ID order."""
+        return [self.document(row) for row in range(len(self))]
+
+    def save(self, keep_ids: Sequence[int], new_documents: List[Dict[str, Any]]) -> str:
+        """
+        Save a new version of the store.
+
+        Args:
+            keep_ids: Vector IDs of stored chunks to keep
+            new_documents: Documents to add, each with a vector_id
+
+        Returns:
+            Version stamp of the saved store
+        """
+        version = uuid.uuid4().hex
+        keep_rows = self.rows_for(keep_ids)
+        kept = np.array(self._table[keep_rows[keep_rows >= 0]], dtype='int64').reshape(-1, 5)
+        live_size = int(kept[:, LENGTH].sum())
+        encoded = [doc['content'].encode('utf-8') for doc in new_documents]
+
+        text_path = self.text_path
+        if text_path is None or live_size < (self._text_size - live_size):
+            text_path = f"{self.base}.chunks.{version}"
+            kept, sources, text_size = self._compact(kept, text_path)
+        else:
+            sources, text_size = list(self.sources), self._text_size
+            # Drop text left past the used length by an interrupted save
+            with open(text_path, 'ab') as f:
+                f.truncate(text_size)
+
+        source_numbers = {path: number for number, path in enumerate(sources)}
+        rows = []
+        with open(text_path, 'ab') as f:
+            for doc, data in zip(new_documents, encoded):
+                if doc['source'] not in source_numbers:
+                    source_numbers[doc['source']] = len(sources)
+                    sources.append(doc['source'])
+                chunk = int(doc['id'].rsplit('-', 1)[1])
+                rows.append((doc['vector_id'], text_size, len(data), source_numbers[doc['source']], chunk))
+                f.write(data)
+                text_size += len(data)
+
+        table = np.concatenate([kept, np.array(rows, dtype='int64').reshape(-1, 5)])
+        table = table[np.argsort(table[:, VECTOR_ID], kind='stable')]
+
+        table_path = f"{self.base}.chunks.{version}.npy"
+        with open(table_path, 'wb') as f:
+            np.save(f, table)
+
+        meta = {
+            'version': version,
+            'text': os.path.basename(text_path),
+            'table': os.path.basename(table_path),
+            'sources': sources,
+            'text_size': text_size
+        }
+        with open(self.meta_path + ".tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+        # Files of the previous version stay readable through existing maps
+        retired = {self.text_path, self.table_path} - {None, text_path}
+        self._open_version(meta)
+        for path in retired:
+            os.remove(path)
+        return version
+
+    def _compact(self, kept: np.ndarray, text_path: str) -> tuple:
+        """Write the text of the kept chunks to a new buffer, returning their updated rows, sources and text size."""
+        used_sources = sorted(set(kept[:, SOURCE].tolist()))
+        renumber = {old: new for new, old in enumerate(used_sources)}
+        sources = [self.sources[number] for number in used_sources]
+
+        kept = kept.copy()
+        offset = 0
+        with open(text_path, 'wb') as f:
+            for row in kept:
+                f.write(self._text[row[OFFSET]:row[OFFSET] + row[LENGTH]])
+                row[OFFSET] = offset
+                row[SOURCE] = renumber[int(row[SOURCE])]
+                offset += int(row[LENGTH])
+        return kept, sources, offset
@@ -0,0 +1,119 @@
+"""
+On-disk cache of chunk embeddings for the knowledge base.
+"""
+import os
+import re
+import hashlib
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+
+def embedder_id(embedder) -> str:
+    """Identify an embedder by its class, model ID and dimensions."""
+    parts = [type(embedder).__name__, getattr(embedder, "id", None), getattr(embedder, "dimensions", None)]
+    return "-".join(str(part) for part in parts if part is not None)
+
+
+def content_hash(text: str) -> str:
+    """Hash the content of a chunk."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caches embeddings keyed by embedder ID and a hash of the chunk text.
+
+    Each embedder gets two files in ``cache_dir``: ``<id>.f32``, the
+    embeddings as consecutive float32 rows, and ``<id>.keys``, a line with
+    the dimension followed by the content hash of each row, one per line.
+    Both are only ever appended to, the vectors before their keys, so a row
+    counts as cached once its key line is complete.
+    """
+    def __init__(self, cache_dir: str, embedder_id: str):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            cache_dir: Directory to store the cache files in
+            embedder_id: ID of the embedder the cached embeddings come from
+        """
+        self.embedder_id = embedder_id
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", embedder_id)
+        self.vectors_path = os.path.join(cache_dir, name + ".f32")
+        self.keys_path = os.path.join(cache_dir, name + ".keys")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._rows: Dict[str, int] = {}
+        self.dimension: Optional[int] = None
+        self._load()
+
+    def _load(self) -> None:
+        """Index the cached rows, dropping any left incomplete by an interrupted write."""
+        lines = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, 'r') as f:
+                lines = [line[:-1] for line in f if line.endswith("\n")]
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+
+        header, keys = [], []
+        if lines:
+            header = lines[:1]
+            self.dimension = int(lines[0])
+            keys = lines[1:vectors_size // 4 // self.dimension + 1]
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+        # Trim both files back to the complete rows
+        with open(self.keys_path, 'a') as f:
+            f.truncate(sum(len(line) + 1 for line in header + keys))
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(len(keys) * 4 * (self.dimension or 0))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            keys: Content hashes to look up
+
+        Returns:
+            Embedding of each cached key
+        """
+        found = {key: self._rows[key] for key in keys if key in self._rows}
+        if not found:
+            return {}
+
+        vectors = np.memmap(self.vectors_path, dtype='float32', mode='r').reshape(-1, self.dimension)
+        return {key: np.array(vectors[row]) for key, row in found.items()}
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        """
+        Add embeddings to the cache.
+
+        Args:
+            keys: Content hashes of the embedded chunks
+            vectors: Embeddings, one row per key
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        new = [row for row, key in enumerate(keys) if key not in self._rows]
+        if not new:
+            return
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            with open(self.keys_path, 'a') as f:
+                f.write(f"{self.dimension}\n")
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected embeddings of dimension {self.dimension}, got {vectors.shape[1]}")
+
+        # Duplicate keys within the batch are stored once
+        unique = {keys[row]: row for row in new}
+        with open(self.vectors_path, 'ab') as f:
+            f.write(vectors[list(unique.values())].tobytes())
+        with open(self.keys_path, 'a') as f:
+            f.write("".join(key + "\n" for key in unique))
+
+        start = len(self._rows)
+        for offset, key in enumerate(unique):
+            self._rows[key] = start + offset
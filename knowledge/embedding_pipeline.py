@@ -0,0 +1,129 @@
+"""
+Batched, concurrent embedding of knowledge base chunks.
+"""
+import time
+import logging
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text, at about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def token_batches(texts: Sequence[str], max_tokens: int, max_size: int) -> Iterator[List[int]]:
+    """
+    Split texts into consecutive batches bounded by estimated tokens and count.
+
+    Args:
+        texts: Texts to split
+        max_tokens: Maximum estimated tokens per batch (a longer text gets a batch of its own)
+        max_size: Maximum number of texts per batch
+
+    Returns:
+        Iterator over the indices of the texts in each batch
+    """
+    batch, tokens = [], 0
+    for i, text in enumerate(texts):
+        text_tokens = estimate_tokens(text)
+        if batch and (tokens + text_tokens > max_tokens or len(batch) >= max_size):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(i)
+        tokens += text_tokens
+    if batch:
+        yield batch
+
+
+class EmbeddingPipeline:
+    """
+    Embeds texts in token-bounded batches on a bounded thread pool.
+
+    At most ``max_in_flight`` batches are submitted at a time and finished
+    batches are yielded as soon as they complete, so memory stays flat
+    however many texts there are and the consumer (e.g. adding vectors to
+    the index) applies backpressure. A failed batch is retried on its own
+    with exponential backoff.
+    """
+    def __init__(self,
+                 embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_batch_tokens: int = 16000,
+                 max_batch_size: int = 256,
+                 max_workers: int = 4,
+                 max_in_flight: Optional[int] = None,
+                 max_retries: int = 3,
+                 retry_delay: float = 1.0):
+        """
+        Initialize the embedding pipeline.
+
+        Args:
+            embed_fn: Function embedding a list of texts, e.g. embedder.embed_documents
+            max_batch_tokens: Maximum estimated tokens per request
+            max_batch_size: Maximum number of texts per request
+            max_workers: Number of requests to run concurrently
+            max_in_flight: Maximum number of batches submitted but not yet consumed (defaults to twice max_workers)
+            max_retries: Number of times to retry a failed batch
+            retry_delay: Delay before the first retry in seconds, doubled on each further retry
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch, retrying it on failure."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = np.array(self.embed_fn(texts), dtype='float32')
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning("Embedding batch of %s failed (%s), retrying in %.1fs", len(texts), e, delay)
+                time.sleep(delay)
+
+    def run(self, texts: Sequence[str]) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """
+        Embed texts, yielding each batch as it finishes.
+
+        Batches may finish out of order. If a batch still fails after its
+        retries, the error is raised and the batches not yet started are
+        cancelled.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Iterator over (indices of the texts in the batch, their embeddings) pairs
+        """
+        batches = token_batches(texts, self.max_batch_tokens, self.max_batch_size)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            try:
+                for indices in batches:
+                    if len(pending) >= self.max_in_flight:
+                        yield from self._collect(pending)
+                    future = executor.submit(self._embed_batch, [texts[i] for i in indices])
+                    pending[future] = indices
+                while pending:
+                    yield from self._collect(pending)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _collect(self, pending: dict) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """Wait for at least one pending batch and yield every finished one."""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            indices = pending.pop(future)
+            yield indices, future.result()
@@ -0,0 +1,81 @@
+"""
+Local embedder for running the knowledge base offline.
+"""
+import re
+import time
+import random
+import hashlib
+import threading
+import numpy as np
+from typing import List
+
+
+class FakeEmbedder:
+    """
+    Deterministic embedder that needs no network access or API key.
+
+    Texts are embedded by hashing their words into a fixed number of
+    dimensions and normalizing the counts, so texts sharing words end up
+    close together and searches return sensible results. Latency and
+    random failures can be simulated to exercise the embedding pipeline.
+    """
+    def __init__(self,
+                 dimensions: int = 256,
+                 latency: float = 0.0,
+                 failure_rate: float = 0.0,
+                 seed: int = 0):
+        """
+        Initialize the fake embedder.
+
+        Args:
+            dimensions: Number of embedding dimensions
+            latency: Seconds each embedding request takes
+            failure_rate: Probability that an embedding request raises an error
+            seed: Seed for the simulated failures
+        """
+        self.id = "fake"
+        self.dimensions = dimensions
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.texts_embedded = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype='float32')
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text
+        """
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise RuntimeError("Simulated embedding failure")
+
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a search query."""
+        return self._embed(query)
+
+    def get_embedding(self, text: str) -> List[float]:
+        """Embed a single text."""
+        return self._embed(text)
@@ -2,19 +2,60 @@
 Knowledge base loaders for the SDLC workflow.
 """
 import os
+import json
+import hashlib
 import faiss
 import numpy as np
 from typing import List, Dict, Any, Optional
 from agno.embedder.openai import OpenAIEmbedder
 
+from knowledge.ann_index import (
+    INDEX_TYPES, create_index, has_ids, plan_index, recall_report, set_search_params, supports_removal
+)
+from knowledge.chunk_store import ChunkStore
+from knowledge.embedding_cache import EmbeddingCache, content_hash, embedder_id
+from knowledge.embedding_pipeline import EmbeddingPipeline
+
+# Number of chunks looked up in the embedding cache at a time
+CACHE_LOOKUP_BATCH = 1024
+
 class FAISSKnowledgeBase:
     """
     Knowledge base using FAISS for vector storage and retrieval.
+
+    Chunk embeddings are cached on disk by embedder and chunk content, so
+    rebuilding the index only embeds chunks that changed. Chunks missing
+    from the cache are embedded in concurrent, token-bounded batches, and
+    each batch is added to the index as soon as it finishes.
+
+    Vectors are stored under stable IDs (``vector_id`` on each document),
+    and a manifest next to the index (``<index_path>.manifest.json``)
+    records the modification time, size, content hash and vector IDs of
+    every source file. ``update_index()`` uses it to remove and re-add only
+    the chunks of files that were added, changed or deleted.
+
+    The chunks themselves are saved with the index in a memory-mapped
+    ChunkStore whose version stamp is recorded in the manifest. A warm
+    start opens the store instead of re-reading the source files, search
+    hits are looked up by vector ID in the store that was saved with the
+    index, and chunk text is only read for the hits.
+
+    ``index_type`` selects exact ("flat") or approximate ("ivf_flat",
+    "ivf_pq", "hnsw") search, or "auto" to pick from the corpus size and
+    ``memory_budget_mb``. IVF indexes are trained on a random sample of the
+    chunks as their embeddings arrive.
     """
     def __init__(self,
                  docs_path: str,
                  index_path: Optional[str] = None,
-                 embedder = None):
+                 embedder = None,
+                 cache_dir: Optional[str] = None,
+                 embed_workers: int = 4,
+                 embed_batch_tokens: int = 16000,
+                 index_type: str = "flat",
+                 nprobe: int = 16,
+                 ef_search: int = 64,
+                 memory_budget_mb: float = 1024):
         """
         Initialize the FAISS knowledge base.
 
@@ -22,13 +63,42 @@ class FAISSKnowledgeBase:
             docs_path: Path to the documents directory
             index_path: Path to save the FAISS index (defaults to docs_path/index.faiss)
             embedder: Embedder to use for document embedding
+            cache_dir: Directory for the embedding cache (defaults to docs_path/embedding_cache)
+            embed_workers: Number of embedding requests to run concurrently
+            embed_batch_tokens: Maximum estimated tokens per embedding request
+            index_type: "flat", "ivf_flat", "ivf_pq", "hnsw" or "auto"
+            nprobe: Number of IVF lists to search per query
+            ef_search: Size of the HNSW candidate list per query
+            memory_budget_mb: Memory the index may use, for picking an index type in "auto" mode
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}. Expected one of {', '.join(INDEX_TYPES)}")
         self.docs_path = docs_path
         self.index_path = index_path or os.path.join(docs_path, "index.faiss")
         self.embedder = embedder or OpenAIEmbedder(id="text-embedding-3-small")
+        self.embedding_cache = EmbeddingCache(
+            cache_dir or os.path.join(docs_path, "embedding_cache"),
+            embedder_id(self.embedder)
+        )
+        self.embedding_pipeline = EmbeddingPipeline(
+            self.embedder.embed_documents,
+            max_batch_tokens=embed_batch_tokens,
+            max_workers=embed_workers
+        )
 
-        self.documents = []
+        self._documents: Optional[List[Dict[str, Any]]] = []
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._files: Dict[str, Dict[str, Any]] = {}
         self.index = None
+        self.chunk_store: Optional[ChunkStore] = None
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.memory_budget_mb = memory_budget_mb
+        self.built_index_type: Optional[str] = None
+        self._expected_vectors = 0
+        self._train_size = 0
+        self._untrained: List[tuple] = []
 
         # Create documents directory if it doesn't exist
         os.makedirs(docs_path, exist_ok=True)
@@ -44,23 +114,54 @@ class FAISSKnowledgeBase:
             List of loaded documents
         """
         documents = []
+        self._files = {}
 
         for file_path in file_paths:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            info, content = self._read_file(file_path)
+            self._files[file_path] = info
+            documents.extend(self._chunk_file(file_path, content))
 
-            # Split content into chunks
-            chunks = self._split_into_chunks(content, chunk_size=512)
+        self._set_documents(documents)
+        return documents
 
-            for i, chunk in enumerate(chunks):
-                documents.append({
-                    'id': f"{os.path.basename(file_path)}-{i}",
-                    'source': file_path,
-                    'content': chunk
-                })
+    def _read_file(self, file_path: str) -> tuple:
+        """Read a source file, returning its manifest entry and content."""
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        info = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': hashlib.sha256(data).hexdigest()
+        }
+        return info, data.decode('utf-8')
 
-        self.documents = documents
-        return documents
+    def _chunk_file(self, file_path: str, content: str) -> List[Dict[str, Any]]:
+        """Split the content of a source file into documents."""
+        # Split content into chunks
+        chunks = self._split_into_chunks(content, chunk_size=512)
+
+        return [{
+            'id': f"{os.path.basename(file_path)}-{i}",
+            'source': file_path,
+            'content': chunk
+        } for i, chunk in enumerate(chunks)]
+
+    @property
+    def documents(self) -> List[Dict[str, Any]]:
+        """The loaded documents, read from the chunk store if they were not loaded from the source files."""
+        if self._documents is None:
+            self._documents = self.chunk_store.documents() if self.chunk_store is not None else []
+        return self._documents
+
+    @documents.setter
+    def documents(self, documents: List[Dict[str, Any]]) -> None:
+        self._set_documents(documents)
+
+    def _set_documents(self, documents: Optional[List[Dict[str, Any]]]) -> None:
+        """Replace the loaded documents, indexing them by vector ID (or position, for older indexes)."""
+        self._documents = documents
+        self._by_id = {doc.get('vector_id', i): doc for i, doc in enumerate(documents or [])}
 
     def _split_into_chunks(self, text: str, chunk_size: int = 512) -> List[str]:
         """Split text into chunks of approximately chunk_size characters."""
@@ -88,28 +189,286 @@ class FAISSKnowledgeBase:
         if not self.documents:
             raise ValueError("No documents loaded. Call load_documents first.")
 
-        # Get embeddings for all documents
-        texts = [doc['content'] for doc in self.documents]
-        embeddings = self.embedder.embed_documents(texts)
-
-        # Convert to numpy array
-        embeddings_np = np.array(embeddings).astype('float32')
+        # Embed all documents into a new index
+        ids = np.arange(len(self.documents), dtype='int64')
+        self.index = None
+        self._add_documents(self.documents, ids)
 
-        # Create FAISS index
-        dimension = embeddings_np.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings_np)
+        for doc, vector_id in zip(self.documents, ids.tolist()):
+            doc['vector_id'] = vector_id
+        self._set_documents(self.documents)
 
         # Save index
-        faiss.write_index(self.index, self.index_path)
+        files = {}
+        for doc in self.documents:
+            source = doc['source']
+            if source not in files:
+                files[source] = dict(self._files.get(source) or self._read_file(source)[0], ids=[])
+            files[source]['ids'].append(doc['vector_id'])
+        self._save(files, len(self.documents), [], self.documents)
+
+    def _add_documents(self, documents: List[Dict[str, Any]], ids: np.ndarray) -> None:
+        """
+        Embed documents and add their vectors to the index.
+
+        Cached embeddings are added right away. The rest are embedded by
+        the pipeline, and each finished batch is cached and added before
+        the next is collected, so only a few batches are held in memory.
+
+        Args:
+            documents: Documents to add
+            ids: Vector ID of each document
+        """
+        if self.index is None:
+            # Drop vectors held back by an earlier build that failed before training
+            self._untrained = []
+            self._expected_vectors = len(documents)
+            if self.index_type != "flat":
+                # Embeddings arrive in document order, so shuffle to train on a random sample
+                order = np.random.default_rng(0).permutation(len(documents))
+                documents, ids = [documents[i] for i in order], ids[order]
+
+        texts = [doc['content'] for doc in documents]
+        keys = [content_hash(text) for text in texts]
+
+        missing = []
+        for start in range(0, len(keys), CACHE_LOOKUP_BATCH):
+            rows = range(start, min(start + CACHE_LOOKUP_BATCH, len(keys)))
+            cached = self.embedding_cache.get_many([keys[row] for row in rows])
+            hits = [row for row in rows if keys[row] in cached]
+            missing.extend(row for row in rows if keys[row] not in cached)
+            if hits:
+                self._add_vectors(np.stack([cached[keys[row]] for row in hits]), ids[hits])
+
+        for batch, vectors in self.embedding_pipeline.run([texts[row] for row in missing]):
+            rows = [missing[i] for i in batch]
+            self.embedding_cache.put_many([keys[row] for row in rows], vectors)
+            self._add_vectors(vectors, ids[rows])
+
+        if self._untrained:
+            self._train()
+
+    def _add_vectors(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Add vectors to the index, creating it on the first call and holding them back until it is trained."""
+        if self.index is None:
+            # Create FAISS index, with IDs so chunks can later be removed and re-added
+            self.built_index_type, spec, self._train_size = plan_index(
+                self.index_type, self._expected_vectors, vectors.shape[1], self.memory_budget_mb
+            )
+            self.index = create_index(spec, vectors.shape[1])
+            set_search_params(self.index, self.nprobe, self.ef_search)
+
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+
+        self._untrained.append((vectors, ids))
+        if sum(len(batch) for batch, _ in self._untrained) >= self._train_size:
+            self._train()
+
+    def _train(self) -> None:
+        """Train the index on the held-back vectors, then add them."""
+        vectors = np.concatenate([batch for batch, _ in self._untrained])
+        ids = np.concatenate([batch_ids for _, batch_ids in self._untrained])
+        self._untrained = []
+        if not self.index.is_trained:
+            self.index.train(vectors[:max(self._train_size, 1)])
+        self.index.add_with_ids(vectors, ids)
+
+    def _read_index(self) -> None:
+        """Read the index from disk and apply the search settings."""
+        self.index = faiss.read_index(self.index_path)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+
+    @property
+    def manifest_path(self) -> str:
+        """Path of the manifest of indexed files."""
+        return self.index_path + ".manifest.json"
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Load the manifest and open the chunk store saved with it, or return None if either does not match the index."""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        vectors = sum(len(entry['ids']) for entry in manifest['files'].values())
+        if manifest.get('embedder') != self.embedding_cache.embedder_id or vectors != self.index.ntotal:
+            return None
+        self.built_index_type = manifest.get('index_type', 'flat')
+
+        chunk_store = ChunkStore.open(self.index_path)
+        if chunk_store is None or chunk_store.version != manifest.get('chunks_version') or len(chunk_store) != vectors:
+            return None
+        self.chunk_store = chunk_store
+        return manifest
+
+    def _save(self, files: Dict[str, Dict[str, Any]], next_id: int,
+              keep_ids: List[int], new_documents: List[Dict[str, Any]]) -> None:
+        """
+        Write the index, the chunk store and then the manifest, each replacing the old version atomically.
+
+        Args:
+            files: Manifest entry of every indexed file
+            next_id: Next unused vector ID
+            keep_ids: Vector IDs of chunks to keep from the current chunk store
+            new_documents: Documents to add to the chunk store
+        """
+        tmp_path = self.index_path + ".tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+        chunk_store = self.chunk_store or ChunkStore.open(self.index_path) or ChunkStore(self.index_path)
+        manifest = {
+            'embedder': self.embedding_cache.embedder_id,
+            'index_type': self.built_index_type,
+            'next_id': next_id,
+            'chunks_version': chunk_store.save(keep_ids, new_documents),
+            'files': files
+        }
+        self.chunk_store = chunk_store
+
+        # The manifest is written last, so it only ever refers to a complete index and chunk store
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
 
     def load_index(self) -> None:
-        """Load the FAISS index from disk."""
+        """Load the FAISS index, and the chunk store saved with it, from disk."""
         if os.path.exists(self.index_path):
-            self.index = faiss.read_index(self.index_path)
+            self._read_index()
         else:
             raise FileNotFoundError(f"Index file not found at {self.index_path}")
 
+        self.chunk_store = None
+        self._read_manifest()
+        if not self._documents:
+            self._set_documents(None)
+
+    def update_index(self, file_paths: List[str]) -> Dict[str, int]:
+        """
+        Bring the index up to date with the given files.
+
+        Files whose modification time and size match the manifest are
+        trusted unchanged and not read at all; otherwise their content hash
+        decides. Only the chunks of added, changed and removed files are
+        read, embedded, removed or added. Without a usable index, manifest
+        and chunk store, the index is built from scratch.
+
+        Args:
+            file_paths: Paths of all files that should be in the index
+
+        Returns:
+            Number of files added, changed, removed and unchanged
+        """
+        manifest = None
+        self.chunk_store = None
+        if os.path.exists(self.index_path):
+            self._read_index()
+            manifest = self._read_manifest()
+        if (manifest is None or not has_ids(self.index) or
+                self.index_type not in ("auto", self.built_index_type)):
+            self.load_documents(file_paths)
+            self.build_index()
+            return {'added': len(file_paths), 'changed': 0, 'removed': 0, 'unchanged': 0}
+
+        indexed = manifest['files']
+        counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+        files = {}
+        keep_ids = []
+        stale_ids = []
+        new_documents = []
+        touched = False
+
+        for file_path in file_paths:
+            entry = indexed.get(file_path)
+            stat = os.stat(file_path)
+            if entry is not None and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+                files[file_path] = entry
+                keep_ids.extend(entry['ids'])
+                counts['unchanged'] += 1
+                continue
+
+            info, content = self._read_file(file_path)
+            if entry is not None and entry['sha256'] == info['sha256']:
+                # Only the modification time changed
+                files[file_path] = dict(info, ids=entry['ids'])
+                keep_ids.extend(entry['ids'])
+                counts['unchanged'] += 1
+                touched = True
+                continue
+
+            if entry is not None:
+                stale_ids.extend(entry['ids'])
+            chunks = self._chunk_file(file_path, content)
+            files[file_path] = dict(info, ids=[])
+            new_documents.extend(chunks)
+            counts['changed' if entry is not None else 'added'] += 1
+
+        for file_path in set(indexed) - set(file_paths):
+            stale_ids.extend(indexed[file_path]['ids'])
+            counts['removed'] += 1
+
+        next_id = manifest['next_id']
+        for doc in new_documents:
+            doc['vector_id'] = next_id
+            files[doc['source']]['ids'].append(next_id)
+            next_id += 1
+        new_ids = np.array([doc['vector_id'] for doc in new_documents], dtype='int64')
+
+        if stale_ids and not supports_removal(self.index):
+            # HNSW cannot remove vectors, so the index is rebuilt, mostly from cached embeddings
+            documents = [self.chunk_store.document(row) for row in self.chunk_store.rows_for(keep_ids)]
+            documents.extend(new_documents)
+            self.index = None
+            self._add_documents(documents, np.array([doc['vector_id'] for doc in documents], dtype='int64'))
+        else:
+            if stale_ids:
+                self.index.remove_ids(np.array(stale_ids, dtype='int64'))
+            if new_documents:
+                self._add_documents(new_documents, new_ids)
+
+        if stale_ids or new_documents or touched:
+            self._save(files, next_id, keep_ids, new_documents)
+
+        # Documents are read from the chunk store when needed
+        self._set_documents(None)
+        return counts
+
+    def recall_report(self, queries: Optional[List[str]] = None,
+                      k: int = 10, num_queries: int = 100) -> List[Dict[str, Any]]:
+        """
+        Compare the recall and latency of the index with an exact flat search.
+
+        The exact vectors come from the embedding cache.
+
+        Args:
+            queries: Query texts (defaults to a sample of the indexed chunks)
+            k: Number of neighbours per query
+            num_queries: Number of chunks to sample as queries when none are given
+
+        Returns:
+            One row per search setting, preceded by the flat baseline
+        """
+        if self.index is None:
+            raise ValueError("Index not built or loaded. Call build_index or load_index first.")
+
+        documents = self.documents
+        keys = [content_hash(doc['content']) for doc in documents]
+        cached = self.embedding_cache.get_many(keys)
+        rows = [i for i, key in enumerate(keys) if key in cached]
+        vectors = np.stack([cached[keys[i]] for i in rows])
+        ids = np.array([documents[i].get('vector_id', i) for i in rows], dtype='int64')
+
+        if queries:
+            query_vectors = np.array([self.embedder.embed_query(query) for query in queries], dtype='float32')
+        else:
+            sample = np.random.default_rng(0).choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+            query_vectors = vectors[sample]
+        return recall_report(self.index, vectors, ids, query_vectors, k)
+
     def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """
         Search the knowledge base for documents matching the query.
@@ -131,13 +490,64 @@ class FAISSKnowledgeBase:
         # Search index
         distances, indices = self.index.search(query_np, k)
 
-        # Get matching documents
+        return self._collect_results(distances, indices)[0]
+
+    def search_many(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Search the knowledge base for several queries at once.
+
+        All queries are embedded in one batched request and searched with
+        a single call on the index, which costs about as much as one search.
+
+        Args:
+            queries: Query texts
+            k: Number of results to return per query
+
+        Returns:
+            List of matching documents with scores for each query, in query order
+        """
+        if self.index is None:
+            raise ValueError("Index not built or loaded. Call build_index or load_index first.")
+        if not queries:
+            return []
+
+        # Embed all queries in one request; embed_query would make one request per query
+        query_np = np.array(self.embedder.embed_documents(queries), dtype='float32')
+
+        # Search index
+        distances, indices = self.index.search(query_np, k)
+
+        return self._collect_results(distances, indices)
+
+    def _collect_results(self, distances: np.ndarray, indices: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """
+        Turn the result matrices of an index search into documents with scores.
+
+        Hits are resolved with array operations, and a chunk returned for
+        several queries is read only once.
+
+        Args:
+            distances: Distances returned by the index, one row per query
+            indices: Vector IDs returned by the index, -1 where there was no hit
+
+        Returns:
+            List of matching documents with scores for each query
+        """
+        if self.chunk_store is not None:
+            # Get matching documents, reading only their chunks from the chunk store
+            keys = self.chunk_store.rows_for(indices.ravel()).reshape(indices.shape)
+            unique, inverse = np.unique(keys, return_inverse=True)
+            documents = [self.chunk_store.document(row) if row >= 0 else None for row in unique.tolist()]
+        else:
+            unique, inverse = np.unique(indices, return_inverse=True)
+            documents = [self._by_id.get(vector_id) for vector_id in unique.tolist()]
+        inverse = inverse.reshape(indices.shape)
+
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):
-                results.append({
-                    **self.documents[idx],
-                    'score': float(distances[0][i])
-                })
-
-        return results
\ No newline at end of file
+        for hits, scores in zip(inverse.tolist(), distances.tolist()):
+            results.append([
+                {**documents[hit], 'score': score}
+                for hit, score in zip(hits, scores)
+                if documents[hit] is not None
+            ])
+        return results
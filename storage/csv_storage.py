@@ -2,37 +2,1156 @@
 CSV-based storage for agent sessions.
 """
 import os
+import io
+import re
 import csv
+import gzip
 import json
+import time
 import uuid
+import atexit
+import logging
 import datetime
-from typing import Dict, List, Optional, Any
+import threading
+import heapq
+import weakref
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+from itertools import islice, takewhile
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Union
 
-class CSVAgentStorage:
+from storage.rows import COLUMNS, SessionRow, normalize_columns
+from storage.session_protocol import AgnoSessionProtocol
+
+FIELDNAMES = list(COLUMNS)
+
+# Number of bytes read per step when scanning a CSV file backwards
+TAIL_BLOCK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Buffered storages that still need a final flush when the interpreter exits
+_BUFFERED_STORAGES = weakref.WeakSet()
+
+# Parsed sidecar indexes of other processes' shards, by index path
+_SHARD_INDEXES: Dict[str, "_ShardIndex"] = {}
+_SHARD_INDEXES_LOCK = threading.Lock()
+
+
+@atexit.register
+def _flush_buffered_storages() -> None:
+    """Flush every buffered storage that was not closed explicitly."""
+    for storage in list(_BUFFERED_STORAGES):
+        storage.close()
+
+
+def _encode_row(values: List[Any]) -> bytes:
+    """Encode a single CSV row to bytes exactly as it will appear on disk."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _decode_record(raw: bytes) -> List[str]:
+    """Decode the raw bytes of one CSV record into its field values."""
+    return next(csv.reader(io.StringIO(raw.decode('utf-8'), newline='')), [])
+
+
+def _timestamp_key(values: List[str]) -> str:
+    """Sort key that orders raw rows by their timestamp column."""
+    return values[1]
+
+
+def _iter_records(f, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+    """
+    Iterate over the raw records of a binary CSV file.
+
+    Quoted fields may span several physical lines, so a line only ends a
+    record once the number of quote characters seen in the record is even.
+
+    Args:
+        f: File object opened in binary mode
+        start: Byte offset of the first record to read
+        end: Optional byte offset at which to stop reading
+
+    Yields:
+        Tuples of (byte offset, raw record bytes)
+    """
+    f.seek(start)
+    offset = start
+    record = b""
+    quotes = 0
+    for line in f:
+        if end is not None and offset + len(record) >= end:
+            return
+        record += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield offset, record
+            offset += len(record)
+            record = b""
+            quotes = 0
+    if record:
+        yield offset, record
+
+
+def _iter_records_reverse(f, start: int = 0, end: Optional[int] = None,
+                          block_size: int = TAIL_BLOCK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    Iterate over the raw records of a binary CSV file from the end backwards.
+
+    The file is read in blocks from the end, so the cost depends on how many
+    records are consumed rather than on the size of the file. A newline ends a
+    record only when an even number of quote characters follows it up to the
+    end of the file; newlines inside quoted fields always have an odd number
+    of quotes after them within their record.
+
+    Args:
+        f: File object opened in binary mode
+        start: Byte offset of the first record (records before it are ignored)
+        end: Optional byte offset of the end of the last record to read
+        block_size: Number of bytes to read per step
+
+    Yields:
+        Tuples of (byte offset, raw record bytes), newest record first
+    """
+    pos = f.seek(0, os.SEEK_END)
+    if end is not None:
+        pos = min(pos, end)
+    pending = b""
+    quotes = 0
+
+    while pos > start:
+        size = min(block_size, pos - start)
+        pos -= size
+        f.seek(pos)
+        block = f.read(size)
+
+        # `hi` bounds the unfinished record inside this block, `i` is the scan cursor
+        hi = i = len(block)
+        while True:
+            nl = block.rfind(b'\n', 0, i)
+            if nl == -1:
+                quotes += block.count(b'"', 0, i)
+                pending = block[:hi] + pending
+                break
+
+            quotes += block.count(b'"', nl + 1, i)
+            i = nl
+            if quotes % 2 == 0:
+                record = block[nl + 1:hi] + pending
+                if record:
+                    yield pos + nl + 1, record
+                pending = b""
+                hi = nl + 1
+
+    if pending:
+        yield start, pending
+
+
+def _find_data_start(f) -> int:
+    """Return the byte offset of the first row after the header of an open binary file."""
+    for offset, record in _iter_records(f):
+        return offset + len(record)
+    return 0
+
+
+def _scan_index_entries(f, start: int) -> List[Tuple[str, int]]:
+    """Collect (session_id, offset) pairs for every row from start to the end of the file."""
+    entries = []
+    for offset, record in _iter_records(f, start):
+        values = _decode_record(record)
+        if values:
+            entries.append((values[0], offset))
+    return entries
+
+
+def _read_index_file(index_path: str) -> Dict[str, List[int]]:
+    """Read a sidecar offset index into memory, skipping a torn final entry."""
+    index: Dict[str, List[int]] = {}
+    with open(index_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) == 2 and row[1].isdigit():
+                index.setdefault(row[0], []).append(int(row[1]))
+    return index
+
+
+def _write_index_file(index_path: str, entries: List[Tuple[str, int]]) -> None:
+    """Atomically replace a sidecar offset index."""
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(entries)
+    os.replace(tmp_path, index_path)
+
+
+def _iter_rows_at(f, offsets: Iterable[int], session_id: Optional[str] = None) -> Iterator[List[str]]:
+    """
+    Read the rows starting at the given byte offsets of an open binary file.
+
+    Args:
+        f: File object opened in binary mode
+        offsets: Byte offsets of the rows to read
+        session_id: Optional session ID the rows must belong to; rows of other sessions are skipped
+
+    Yields:
+        Row values
+    """
+    for offset in offsets:
+        for _, record in _iter_records(f, offset):
+            values = _decode_record(record)
+            if session_id is None or (values and values[0] == session_id):
+                yield values
+            break
+
+
+@contextmanager
+def _file_lock(f):
+    """
+    Hold an exclusive lock on an open file, across processes.
+
+    Writers that append to a file shared with other processes take the lock
+    around working out the offset, writing the row and recording it in the
+    sidecar index, so the recorded offsets always match the rows. Where
+    fcntl is unavailable (Windows), the lock is a no-op.
+    """
+    if fcntl is None:
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _table_stems(csv_dir: str, table_name: str) -> List[str]:
+    """Return the file name prefixes of every shard of a table on disk (``<table>`` and ``<table>.<pid>``)."""
+    pattern = re.compile(re.escape(table_name) + r"(\.\d+)?\.(csv|manifest\.json)$")
+    stems = set()
+    for name in os.listdir(csv_dir):
+        match = pattern.match(name)
+        if match:
+            stems.add(table_name + (match.group(1) or ""))
+    return sorted(stems)
+
+
+def _merge_rows(sources: List["_LocalSource"], session_id: Optional[str], since: Optional[str],
+                until: Optional[str], columns: Tuple[str, ...]) -> Iterator[SessionRow]:
+    """Merge the rows of several sources by timestamp, keeping those in the time range."""
+    streams = [
+        (values for values in source.iter_values(session_id, since, until) if len(values) >= 2)
+        for source in sources
+    ]
+    rows = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=_timestamp_key)
+
+    for values in rows:
+        if (since is not None and values[1] < since) or (until is not None and values[1] >= until):
+            continue
+        yield _make_row(values, columns)
+
+
+def _timestamp_bound(value: Union[str, datetime.datetime, None]) -> Optional[str]:
+    """Normalize a time range bound to the ISO format used in the timestamp column."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _make_row(values: List[str], columns: Tuple[str, ...] = COLUMNS) -> SessionRow:
+    """Build a lazy session row from raw CSV values, keeping only the given columns."""
+    return SessionRow({
+        column: value
+        for column, value in zip(FIELDNAMES, values)
+        if column in columns
+    })
+
+
+class _Segment:
+    """
+    A sealed, read-only segment of a CSV table.
+
+    Uncompressed segments keep their own sidecar offset index, which is
+    loaded on the first lookup. Gzip-compressed segments are scanned.
+    """
+    def __init__(self, csv_dir: str, info: Dict[str, Any]):
+        """
+        Initialize the segment.
+
+        Args:
+            csv_dir: Directory containing the segment files
+            info: Manifest entry describing the segment
+        """
+        self.info = info
+        self.path = os.path.join(csv_dir, info['name'])
+        self.index_path = None if info.get('compressed') else self.path[:-len('.csv')] + '.idx'
+        self._index: Optional[Dict[str, List[int]]] = None
+        self._pinned = None
+
+    @property
+    def compressed(self) -> bool:
+        return bool(self.info.get('compressed'))
+
+    def pin(self) -> None:
+        """Open the segment now so it stays readable if another process renames or deletes it."""
+        self._pinned = open(self.path, 'rb')
+
+    def unpin(self) -> None:
+        """Release a pinned segment."""
+        if self._pinned is not None:
+            self._pinned.close()
+            self._pinned = None
+
+    def open(self):
+        """Open the segment for binary reading."""
+        if self._pinned is not None:
+            self._pinned.seek(0)
+            return gzip.GzipFile(fileobj=self._pinned) if self.compressed else nullcontext(self._pinned)
+        return gzip.open(self.path, 'rb') if self.compressed else open(self.path, 'rb')
+
+    def overlaps(self, since: Optional[str], until: Optional[str]) -> bool:
+        """Check whether the segment may contain rows in the given time range."""
+        first, last = self.info.get('first_timestamp'), self.info.get('last_timestamp')
+        if since is not None and last is not None and last < since:
+            return False
+        if until is not None and first is not None and first >= until:
+            return False
+        return True
+
+    def index(self) -> Dict[str, List[int]]:
+        """Return the segment's offset index, loading or rebuilding it on first use."""
+        if self._index is None:
+            if os.path.exists(self.index_path):
+                self._index = _read_index_file(self.index_path)
+            else:
+                with self.open() as f:
+                    entries = _scan_index_entries(f, _find_data_start(f))
+                if os.path.exists(self.path):
+                    _write_index_file(self.index_path, entries)
+                index: Dict[str, List[int]] = {}
+                for session_id, offset in entries:
+                    index.setdefault(session_id, []).append(offset)
+                self._index = index
+        return self._index
+
+    def iter_entries(self) -> Iterator[Tuple[int, bytes]]:
+        """Iterate over (offset, raw record) pairs of every row in the segment."""
+        with self.open() as f:
+            yield from _iter_records(f, _find_data_start(f))
+
+    def iter_values(self, session_id: Optional[str] = None) -> Iterator[List[str]]:
+        """Iterate over the rows of the segment, oldest first."""
+        if session_id is not None and not self.compressed:
+            offsets = self.index().get(session_id, [])
+            if offsets:
+                with self.open() as f:
+                    yield from _iter_rows_at(f, offsets, session_id)
+            return
+
+        for _, record in self.iter_entries():
+            values = _decode_record(record)
+            if session_id is None or (values and values[0] == session_id):
+                yield values
+
+    def iter_values_reverse(self) -> Iterator[List[str]]:
+        """Iterate over the rows of the segment, newest first."""
+        if self.compressed:
+            # Gzip streams cannot be read backwards, so cold segments are scanned instead
+            yield from reversed([_decode_record(record) for _, record in self.iter_entries()])
+            return
+
+        with self.open() as f:
+            for _, record in _iter_records_reverse(f, _find_data_start(f)):
+                yield _decode_record(record)
+
+
+class _LocalSource:
+    """
+    A reader's view of the table this storage writes to: its sealed
+    segments, the active file up to the flushed end and any buffered rows.
+    """
+    def __init__(self, segments: List[_Segment], active, end: int,
+                 offsets: Optional[List[int]], pending: List[List[str]]):
+        self.segments = segments
+        self.active = active
+        self.end = end
+        self.offsets = offsets
+        self.pending = pending
+
+    def iter_values(self, session_id: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> Iterator[List[str]]:
+        """Iterate over rows oldest first, skipping segments outside the time range."""
+        for segment in self.segments:
+            if segment.overlaps(since, until):
+                yield from segment.iter_values(session_id)
+        if self.offsets is not None:
+            yield from _iter_rows_at(self.active, self.offsets, session_id)
+        else:
+            for _, record in _iter_records(self.active, _find_data_start(self.active), self.end):
+                yield _decode_record(record)
+        yield from self.pending
+
+    def iter_values_reverse(self) -> Iterator[List[str]]:
+        """Iterate over rows newest first, touching sealed segments only when needed."""
+        yield from reversed(self.pending)
+        for _, record in _iter_records_reverse(self.active, _find_data_start(self.active), self.end):
+            yield _decode_record(record)
+        for segment in reversed(self.segments):
+            yield from segment.iter_values_reverse()
+
+    def last_values(self, session_id: str) -> Optional[List[str]]:
+        """Return the newest row of a session, reading at most one row per file."""
+        if self.pending:
+            return self.pending[-1]
+        if self.offsets:
+            return next(_iter_rows_at(self.active, reversed(self.offsets), session_id), None)
+        for segment in reversed(self.segments):
+            if segment.compressed:
+                last = None
+                for last in segment.iter_values(session_id):
+                    pass
+                if last is not None:
+                    return last
+            elif segment.index().get(session_id):
+                with segment.open() as f:
+                    return next(_iter_rows_at(f, reversed(segment.index()[session_id]), session_id), None)
+        return None
+
+    def close(self) -> None:
+        self.active.close()
+
+
+class _ShardIndex:
+    """
+    A sidecar index written by another process, parsed up to a byte position.
+
+    The owner only ever appends to its index, or replaces the file when it
+    rotates or rebuilds it, so later reads parse just the appended tail.
+    """
+    __slots__ = ('file_id', 'position', 'sessions', 'last_offset')
+
+    def __init__(self, file_id: Tuple[int, int]):
+        self.file_id = file_id
+        self.position = 0
+        self.sessions: Dict[str, List[int]] = {}
+        self.last_offset: Optional[int] = None
+
+    @classmethod
+    def read(cls, index_path: str, session_id: Optional[str] = None) -> Tuple[Optional[List[int]], Optional[int]]:
+        """
+        Bring the cached index of a shard up to date.
+
+        Args:
+            index_path: Path of the shard's sidecar index
+            session_id: Optional session ID whose offsets to return
+
+        Returns:
+            A copy of the session's offsets (None without a session ID) and the last indexed offset
+        """
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return ([] if session_id is not None else None), None
+
+        file_id = (stat.st_dev, stat.st_ino)
+        with _SHARD_INDEXES_LOCK:
+            cached = _SHARD_INDEXES.get(index_path)
+            if cached is None or cached.file_id != file_id or stat.st_size < cached.position:
+                cached = _SHARD_INDEXES[index_path] = cls(file_id)
+
+            if stat.st_size > cached.position:
+                with open(index_path, 'rb') as f:
+                    f.seek(cached.position)
+                    data = f.read(stat.st_size - cached.position)
+                # Leave a line still being written for the next read
+                data = data[:data.rfind(b"\n") + 1]
+                for row in csv.reader(io.StringIO(data.decode('utf-8'), newline='')):
+                    if len(row) == 2:
+                        offset = int(row[1])
+                        cached.sessions.setdefault(row[0], []).append(offset)
+                        cached.last_offset = offset
+                cached.position += len(data)
+
+            offsets = list(cached.sessions.get(session_id, [])) if session_id is not None else None
+            return offsets, cached.last_offset
+
+
+class _ShardSource(_LocalSource):
+    """
+    A read-only view of a shard written by another process.
+
+    Every file of the shard is opened up front, so the owner can keep
+    rotating and compacting while the view is read. The active file is only
+    read up to the last row recorded in its offset index, because rows after
+    that may still be in the middle of being written.
+    """
+    def __init__(self, csv_dir: str, stem: str):
+        """
+        Initialize the shard view.
+
+        Args:
+            csv_dir: Directory containing the shard files
+            stem: Common file name prefix of the shard (``<table>`` or ``<table>.<pid>``)
+        """
+        super().__init__([], None, 0, None, [])
+        self.csv_dir = csv_dir
+        self.csv_path = os.path.join(csv_dir, f"{stem}.csv")
+        self.index_path = os.path.join(csv_dir, f"{stem}.idx")
+        self.manifest_path = os.path.join(csv_dir, f"{stem}.manifest.json")
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def open(self, session_id: Optional[str] = None, attempts: int = 3) -> None:
+        """
+        Pin the shard's files, retrying if its owner rotates or compacts meanwhile.
+
+        Args:
+            session_id: Optional session ID whose active offsets to collect
+            attempts: Number of times to retry before reading the shard as it is
+        """
+        for attempt in range(attempts):
+            manifest = self._read_manifest()
+            segments = [_Segment(self.csv_dir, info) for info in manifest.get('segments', [])]
+            try:
+                for segment in segments:
+                    segment.pin()
+                active = open(self.csv_path, 'rb') if os.path.exists(self.csv_path) else None
+            except FileNotFoundError:
+                for segment in segments:
+                    segment.unpin()
+                continue
+
+            if self._read_manifest() == manifest or attempt == attempts - 1:
+                self.segments, self.active = segments, active
+                break
+            for segment in segments:
+                segment.unpin()
+            if active is not None:
+                active.close()
+
+        if self.active is None:
+            return
+
+        # Only trust rows the owner has already indexed
+        offsets, last_offset = _ShardIndex.read(self.index_path, session_id)
+        if last_offset is None:
+            self.end = _find_data_start(self.active)
+        else:
+            record = next(_iter_records(self.active, last_offset), (0, b""))[1]
+            self.end = last_offset + len(record) if record.endswith(b'\n') else last_offset
+        if session_id is not None:
+            self.offsets = [offset for offset in offsets if offset < self.end]
+
+    def iter_values(self, session_id: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None) -> Iterator[List[str]]:
+        if self.active is None:
+            return iter(self.pending)
+        return super().iter_values(session_id, since, until)
+
+    def iter_values_reverse(self) -> Iterator[List[str]]:
+        if self.active is None:
+            for segment in reversed(self.segments):
+                yield from segment.iter_values_reverse()
+            return
+        yield from super().iter_values_reverse()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.unpin()
+        if self.active is not None:
+            self.active.close()
+
+
+class CSVTableReader:
+    """
+    Read-only view of a CSV storage table written by other processes.
+
+    Unlike CSVAgentStorage, it never creates, indexes or rotates any file,
+    so it can be pointed at a storage directory, e.g. for exports, without
+    leaving anything behind. Each shard is read up to the last row its
+    owner has indexed.
+    """
+    def __init__(self, table_name: str, csv_dir: str = "storage/csv", sharded: bool = False):
+        """
+        Initialize the reader.
+
+        Args:
+            table_name: Name of the table to read
+            csv_dir: Directory holding the CSV tables
+            sharded: Merge every per-process shard of the table instead of only ``<table>.csv``
+
+        Raises:
+            FileNotFoundError: If the table has no files to read
+        """
+        self.table_name = table_name
+        self.csv_dir = csv_dir
+        self.sharded = sharded
+
+        stems = _table_stems(csv_dir, table_name)
+        self._stems = stems if sharded else [stem for stem in stems if stem == table_name]
+        if not self._stems:
+            hint = " (it only has per-process shards; read it in sharded mode)" if stems else ""
+            raise FileNotFoundError(f"Table {table_name} not found in {csv_dir}{hint}")
+
+    def iter_sessions(self, session_id: Optional[str] = None,
+                      since: Union[str, datetime.datetime, None] = None,
+                      until: Union[str, datetime.datetime, None] = None,
+                      columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream the table's sessions in the order they were saved.
+
+        Args:
+            session_id: Optional session ID to filter by
+            since: Only include sessions saved at or after this time
+            until: Only include sessions saved before this time
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        since, until = _timestamp_bound(since), _timestamp_bound(until)
+
+        with ExitStack() as stack:
+            sources = []
+            for stem in self._stems:
+                shard = _ShardSource(self.csv_dir, stem)
+                stack.callback(shard.close)
+                shard.open(session_id)
+                sources.append(shard)
+            yield from _merge_rows(sources, session_id, since, until, columns)
+
+    def close(self) -> None:
+        """No-op kept for interface compatibility; files are only open while iterating."""
+
+
+class CSVAgentStorage(AgnoSessionProtocol):
     """
     Storage for agent sessions using CSV files.
     Implements a similar interface to the SqliteAgentStorage from AGNO.
+
+    A sidecar index file (``<table>.idx``) maps every session ID to the byte
+    offsets of its rows, so lookups by session ID seek straight to the
+    matching rows instead of scanning the whole table.
+
+    In buffered mode, saved rows are kept in memory and written in groups by
+    a background thread once enough rows or bytes have accumulated, or when
+    the flush interval elapses. Reads include rows that are still buffered.
+
+    When a maximum segment size or age is set, the active ``<table>.csv`` is
+    sealed into a numbered segment once it grows past the limit, and a
+    manifest (``<table>.manifest.json``) lists the sealed segments in order.
+    Recent reads only touch older segments when the active one does not hold
+    enough rows. ``compact()`` merges sealed segments, dropping superseded
+    rows per session, and can gzip the result.
+
+    In sharded mode, each process appends to its own ``<table>.<pid>.csv``
+    shard (with its own index, manifest and segments), so several worker
+    processes can share a storage directory without locking each other out.
+    Readers merge every shard of the table by timestamp, streaming from disk.
+
+    The class also implements the agno storage protocol used by
+    ``agno.agent.Agent`` (see AgnoSessionProtocol). Agent sessions live in a
+    companion ``<table>.sessions`` table with the same settings.
     """
-    def __init__(self, table_name: str, csv_dir: str = "storage/csv"):
+    def __init__(self, table_name: str, csv_dir: str = "storage/csv",
+                 buffered: bool = False,
+                 flush_rows: int = 100,
+                 flush_bytes: int = 1024 * 1024,
+                 flush_interval: float = 1.0,
+                 max_segment_bytes: Optional[int] = None,
+                 max_segment_age: Optional[float] = None,
+                 compact_after: Optional[int] = None,
+                 compress_segments: bool = False,
+                 sharded: bool = False):
         """
         Initialize the CSV storage.
 
         Args:
             table_name: Name of the table (will be used as the CSV filename)
             csv_dir: Directory to store CSV files
+            buffered: Buffer writes and flush them from a background thread
+            flush_rows: Number of buffered rows that triggers a flush
+            flush_bytes: Number of buffered bytes that triggers a flush
+            flush_interval: Maximum number of seconds a row stays buffered
+            max_segment_bytes: Seal the active segment once it reaches this size
+            max_segment_age: Seal the active segment once it is this many seconds old
+            compact_after: Compact in the background once this many sealed segments exist
+            compress_segments: Gzip segments produced by compaction
+            sharded: Append to a per-process shard and merge all shards on read
         """
         self.table_name = table_name
         self.csv_dir = csv_dir
-        self.csv_path = os.path.join(csv_dir, f"{table_name}.csv")
+        self.sharded = sharded
+        # Storages must be created in the process that uses them, since the shard is per PID
+        self._stem = f"{table_name}.{os.getpid()}" if sharded else table_name
+        self._settings = {
+            'buffered': buffered, 'flush_rows': flush_rows, 'flush_bytes': flush_bytes,
+            'flush_interval': flush_interval, 'max_segment_bytes': max_segment_bytes,
+            'max_segment_age': max_segment_age, 'compact_after': compact_after,
+            'compress_segments': compress_segments, 'sharded': sharded,
+        }
+        self.mode = "agent"
+        self._session_table: Optional["CSVAgentStorage"] = None
+        self._session_owners: Optional[Dict[str, Dict[str, Any]]] = None
+        self.csv_path = os.path.join(csv_dir, f"{self._stem}.csv")
+        self.index_path = os.path.join(csv_dir, f"{self._stem}.idx")
+        self.manifest_path = os.path.join(csv_dir, f"{self._stem}.manifest.json")
+        self.buffered = buffered
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compact_after = compact_after
+        self.compress_segments = compress_segments
+        self._lock = threading.RLock()
+        self._flush_needed = threading.Condition(self._lock)
+        self._pending: List[Tuple[List[str], bytes]] = []
+        self._pending_bytes = 0
+        self._closed = False
+        self._flusher = None
+
+        # Sealed segments, plus bookkeeping so compaction never deletes files in use
+        self._segments: List[_Segment] = []
+        self._next_seq = 1
+        self._active_created = time.time()
+        self._generation = 0
+        self._readers: Counter = Counter()
+        self._retired: List[Tuple[int, List[str]]] = []
+        self._compacting = False
 
         # Create directory if it doesn't exist
         os.makedirs(csv_dir, exist_ok=True)
 
-        # Create CSV file with headers if it doesn't exist
-        if not os.path.exists(self.csv_path):
-            with open(self.csv_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['session_id', 'timestamp', 'input', 'response', 'metadata'])
+        self._load_manifest()
+
+        # Create CSV file with headers if it doesn't exist, locked against other writers of the table
+        with open(self.csv_path, 'ab') as f, _file_lock(f):
+            if not f.seek(0, os.SEEK_END):
+                f.write(_encode_row(FIELDNAMES))
+                f.flush()
+
+            self._data_start = self._find_data_start()
+            self._index: Dict[str, List[int]] = {}
+            self._load_index()
+            self._end = os.path.getsize(self.csv_path)
+
+        if buffered:
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name=f"csv-flusher-{table_name}",
+                daemon=True
+            )
+            self._flusher.start()
+            _BUFFERED_STORAGES.add(self)
+
+    def _segment_name(self, seq: int, compressed: bool = False) -> str:
+        """Return the file name of the sealed segment with the given sequence number."""
+        return f"{self._stem}.seg{seq:06d}.csv" + (".gz" if compressed else "")
+
+    def _load_manifest(self) -> None:
+        """
+        Load the segment manifest and finish any rotation or compaction that
+        was interrupted before all of its files were renamed or deleted.
+        """
+        if not os.path.exists(self.manifest_path):
+            return
+
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+        self._next_seq = manifest.get('next_seq', 1)
+        self._active_created = manifest.get('active_created', self._active_created)
+
+        for path in manifest.get('retired', []):
+            if os.path.exists(path):
+                os.remove(path)
+
+        infos = manifest.get('segments', [])
+        for i, info in enumerate(infos):
+            segment = _Segment(self.csv_dir, info)
+            if not os.path.exists(segment.path):
+                if os.path.exists(segment.path + ".tmp"):
+                    # Compaction wrote the manifest but not the final rename
+                    os.replace(segment.path + ".tmp", segment.path)
+                elif i == len(infos) - 1 and os.path.exists(self.csv_path):
+                    # Rotation wrote the manifest but did not seal the active file yet
+                    os.replace(self.csv_path, segment.path)
+                    if os.path.exists(self.index_path):
+                        os.replace(self.index_path, segment.index_path)
+                else:
+                    logger.warning("Segment %s listed in %s is missing", segment.path, self.manifest_path)
+                    continue
+            self._segments.append(segment)
+
+        self._save_manifest()
+
+    def _save_manifest(self) -> None:
+        """Atomically write the segment manifest."""
+        manifest = {
+            'version': 1,
+            'next_seq': self._next_seq,
+            'active_created': self._active_created,
+            'segments': [segment.info for segment in self._segments],
+            'retired': [path for _, paths in self._retired for path in paths],
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _find_data_start(self) -> int:
+        """Return the byte offset of the first row after the header."""
+        with open(self.csv_path, 'rb') as f:
+            return _find_data_start(f)
+
+    def _load_index(self) -> None:
+        """
+        Load the sidecar offset index, rebuilding it if it is missing or stale.
+
+        Rows appended after the last indexed offset (for example by a process
+        that crashed before updating the index) are indexed on the fly.
+        """
+        index: Dict[str, List[int]] = {}
+        if os.path.exists(self.index_path):
+            index = _read_index_file(self.index_path)
+        last_offset = max((offsets[-1] for offsets in index.values()), default=None)
+
+        if last_offset is not None and not self._offset_matches(last_offset, index):
+            last_offset = None
+
+        if last_offset is None:
+            self._index = {}
+            self._rebuild_index()
+            return
+
+        self._index = index
+        with open(self.csv_path, 'rb') as f:
+            missing = _scan_index_entries(f, last_offset)[1:]
+        self._add_to_index(missing)
+
+    def _offset_matches(self, offset: int, index: Dict[str, List[int]]) -> bool:
+        """Check that an indexed offset still points at the row it was recorded for."""
+        if offset < self._data_start or offset >= os.path.getsize(self.csv_path):
+            return False
+        with open(self.csv_path, 'rb') as f:
+            for _, record in _iter_records(f, offset):
+                values = _decode_record(record)
+                return bool(values) and offset in index.get(values[0], [])
+        return False
+
+    def _rebuild_index(self) -> None:
+        """Rebuild the sidecar index from a full scan of the CSV file."""
+        with open(self.csv_path, 'rb') as f:
+            entries = _scan_index_entries(f, self._data_start)
+        _write_index_file(self.index_path, entries)
+
+        for session_id, offset in entries:
+            self._index.setdefault(session_id, []).append(offset)
+
+    def _add_to_index(self, entries: List[Tuple[str, int]]) -> None:
+        """Record new (session_id, offset) pairs in memory and in the sidecar index."""
+        if not entries:
+            return
+        with open(self.index_path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(entries)
+        for session_id, offset in entries:
+            self._index.setdefault(session_id, []).append(offset)
+
+    def _index_tail(self, end: Optional[int] = None) -> None:
+        """
+        Index rows that other storages on the same table appended to the
+        active file since this one last wrote or read it.
+
+        The rows are only added to the in-memory index, since their writer
+        records them in the sidecar index. A partially written row at the
+        end of the file is left for the next call. If the file shrank,
+        another storage rotated or dropped the table, so the segments and
+        the index are reloaded from disk.
+
+        Args:
+            end: Optional byte offset up to which to index (defaults to the file size)
+        """
+        try:
+            size = os.path.getsize(self.csv_path) if end is None else end
+        except FileNotFoundError:
+            return
+        if size == self._end:
+            return
+
+        if size < self._end:
+            self._segments = []
+            self._load_manifest()
+            self._data_start = self._find_data_start()
+            self._load_index()
+            self._end = os.path.getsize(self.csv_path)
+            return
+
+        with open(self.csv_path, 'rb') as f:
+            for offset, record in _iter_records(f, self._end, size):
+                if offset + len(record) > size or not record.endswith(b"\n") or record.count(b'"') % 2:
+                    break
+                values = _decode_record(record)
+                if values:
+                    self._index.setdefault(values[0], []).append(offset)
+                self._end = offset + len(record)
+
+    def _write_rows(self, rows: List[Tuple[List[str], bytes]]) -> None:
+        """Append encoded rows to the CSV file in a single write and index them."""
+        with open(self.csv_path, 'ab') as f, _file_lock(f):
+            offset = f.seek(0, os.SEEK_END)
+            self._index_tail(offset)
+            f.write(b"".join(data for _, data in rows))
+            f.flush()
+
+            entries = []
+            for values, data in rows:
+                entries.append((values[0], offset))
+                offset += len(data)
+            self._add_to_index(entries)
+            self._end = offset
+
+        if self._should_rotate():
+            self._rotate()
+
+    def _should_rotate(self) -> bool:
+        """Check whether the active segment has outgrown its size or age limit."""
+        if self._end <= self._data_start:
+            return False
+        if self.max_segment_bytes is not None and self._end >= self.max_segment_bytes:
+            return True
+        if self.max_segment_age is not None and time.time() - self._active_created >= self.max_segment_age:
+            return True
+        return False
+
+    def _rotate(self) -> None:
+        """Seal the active CSV file into a numbered segment and start a new one."""
+        with open(self.csv_path, 'rb') as f:
+            first = next(_iter_records(f, self._data_start), (0, b""))[1]
+            last = next(_iter_records_reverse(f, self._data_start, self._end), (0, b""))[1]
+
+        info = {
+            'name': self._segment_name(self._next_seq),
+            'rows': sum(len(offsets) for offsets in self._index.values()),
+            'first_timestamp': (_decode_record(first) + ['', ''])[1] or None,
+            'last_timestamp': (_decode_record(last) + ['', ''])[1] or None,
+            'compressed': False,
+        }
+        segment = _Segment(self.csv_dir, info)
+        segment._index = self._index
+
+        # Record the segment first so an interrupted rotation can be completed on load
+        self._next_seq += 1
+        self._segments.append(segment)
+        self._active_created = time.time()
+        self._save_manifest()
+        os.replace(self.csv_path, segment.path)
+        os.replace(self.index_path, segment.index_path)
+
+        with open(self.csv_path, 'wb') as f:
+            f.write(_encode_row(FIELDNAMES))
+        _write_index_file(self.index_path, [])
+        self._index = {}
+        self._data_start = self._end = os.path.getsize(self.csv_path)
+
+        if self.compact_after is not None and len(self._segments) >= self.compact_after and not self._compacting:
+            threading.Thread(
+                target=self.compact,
+                name=f"csv-compactor-{self.table_name}",
+                daemon=True
+            ).start()
+
+    def compact(self, dedupe: bool = True, compress: Optional[bool] = None) -> None:
+        """
+        Merge all sealed segments into a single segment.
+
+        The active segment is never touched, so writers keep appending while
+        compaction runs. Replaced segment files are deleted once no reader
+        is still iterating over them.
+
+        Args:
+            dedupe: Keep only the newest row of each session across the merged segments
+            compress: Gzip the merged segment (defaults to compress_segments)
+        """
+        if compress is None:
+            compress = self.compress_segments
+
+        with self._lock:
+            if self._compacting or not self._segments:
+                return
+            if len(self._segments) == 1 and not dedupe and self._segments[0].compressed == compress:
+                return
+            self._compacting = True
+            sources = list(self._segments)
+            seq = self._next_seq
+            self._next_seq += 1
+
+        try:
+            latest: Dict[str, Tuple[int, int]] = {}
+            if dedupe:
+                for i, segment in enumerate(sources):
+                    for offset, record in segment.iter_entries():
+                        values = _decode_record(record)
+                        if values:
+                            latest[values[0]] = (i, offset)
+
+            info = {'name': self._segment_name(seq, compress), 'rows': 0,
+                    'first_timestamp': None, 'last_timestamp': None, 'compressed': compress}
+            merged = _Segment(self.csv_dir, info)
+            tmp_path = merged.path + ".tmp"
+            entries = []
+
+            with (gzip.open(tmp_path, 'wb') if compress else open(tmp_path, 'wb')) as out:
+                header = _encode_row(FIELDNAMES)
+                out.write(header)
+                position = len(header)
+                for i, segment in enumerate(sources):
+                    for offset, record in segment.iter_entries():
+                        values = _decode_record(record)
+                        if not values or (dedupe and latest.get(values[0]) != (i, offset)):
+                            continue
+                        out.write(record)
+                        entries.append((values[0], position))
+                        position += len(record)
+                        info['rows'] += 1
+                        if len(values) > 1:
+                            info['first_timestamp'] = info['first_timestamp'] or values[1]
+                            info['last_timestamp'] = values[1]
+
+            if not compress:
+                _write_index_file(merged.index_path, entries)
+
+            with self._lock:
+                retired = []
+                for segment in sources:
+                    retired.append(segment.path)
+                    if segment.index_path:
+                        retired.append(segment.index_path)
+                self._segments = [merged] + self._segments[len(sources):]
+                self._retired.append((self._generation, retired))
+                self._generation += 1
+                self._save_manifest()
+                os.replace(tmp_path, merged.path)
+                self._purge_retired()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _purge_retired(self) -> None:
+        """Delete retired segment files once no reader can still be using them."""
+        oldest_reader = min(self._readers, default=None)
+        remaining = []
+        for generation, paths in self._retired:
+            if oldest_reader is not None and oldest_reader <= generation:
+                remaining.append((generation, paths))
+                continue
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        if len(remaining) != len(self._retired):
+            self._retired = remaining
+            self._save_manifest()
+
+    def _shard_stems(self) -> List[str]:
+        """Return the file name prefixes of every other shard of this table on disk."""
+        return [stem for stem in _table_stems(self.csv_dir, self.table_name) if stem != self._stem]
+
+    @contextmanager
+    def _reading(self, session_id: Optional[str] = None):
+        """
+        Capture a consistent view of the table for a reader.
+
+        The active file is opened while the lock is held, so a concurrent
+        rotation cannot swap it out, and sealed segments stay on disk until
+        the reader finishes. In sharded mode, the other processes' shards
+        are pinned as well.
+
+        Args:
+            session_id: Optional session ID whose offsets and buffered rows to capture
+
+        Yields:
+            List of row sources, the local one first
+        """
+        with ExitStack() as stack:
+            with self._lock:
+                self._index_tail()
+                active = open(self.csv_path, 'rb')
+                generation = self._generation
+                self._readers[generation] += 1
+                local = _LocalSource(
+                    segments=list(self._segments),
+                    active=active,
+                    end=self._end,
+                    offsets=list(self._index.get(session_id, [])) if session_id is not None else None,
+                    pending=[
+                        values for values, _ in self._pending
+                        if session_id is None or values[0] == session_id
+                    ]
+                )
+            stack.callback(self._release, generation)
+            stack.callback(local.close)
+            sources = [local]
+
+            if self.sharded:
+                for stem in self._shard_stems():
+                    shard = _ShardSource(self.csv_dir, stem)
+                    stack.callback(shard.close)
+                    shard.open(session_id)
+                    sources.append(shard)
+
+            yield sources
+
+    def _release(self, generation: int) -> None:
+        """Mark a reader of the given generation as finished."""
+        with self._lock:
+            self._readers[generation] -= 1
+            if not self._readers[generation]:
+                del self._readers[generation]
+            self._purge_retired()
+
+    def _flush_loop(self) -> None:
+        """Background thread that writes buffered rows in groups."""
+        with self._lock:
+            while not self._closed:
+                self._flush_needed.wait(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError:
+                    logger.exception("Failed to flush buffered rows for table %s", self.table_name)
+
+    def flush(self) -> None:
+        """Write all buffered rows to disk."""
+        with self._lock:
+            if self._session_table is not None:
+                self._session_table.flush()
+            if not self._pending:
+                return
+            rows = self._pending
+            self._write_rows(rows)
+            self._pending = []
+            self._pending_bytes = 0
+
+    def close(self) -> None:
+        """Flush buffered rows and stop the background flusher."""
+        with self._lock:
+            self._closed = True
+            self._flush_needed.notify_all()
+            self.flush()
+            session_table = self._session_table
+        if session_table is not None:
+            session_table.close()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        _BUFFERED_STORAGES.discard(self)
 
     def save_session(self, session_id: Optional[str] = None,
                      input_text: str = "",
@@ -53,19 +1172,32 @@ class CSVAgentStorage:
         if session_id is None:
             session_id = str(uuid.uuid4())
 
+        self._append(session_id, input_text, response, json.dumps(metadata or {}))
+        return session_id
+
+    def _append(self, session_id: str, input_text: str, response: str, metadata_json: str) -> None:
+        """Write or buffer one row with the current timestamp."""
         timestamp = datetime.datetime.now().isoformat()
-        metadata_json = json.dumps(metadata or {})
+        values = [session_id, timestamp, input_text, response, metadata_json]
+        data = _encode_row(values)
 
-        with open(self.csv_path, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([session_id, timestamp, input_text, response, metadata_json])
+        with self._lock:
+            if not self.buffered or self._closed:
+                self._write_rows([(values, data)])
+                return
 
-        return session_id
+            self._pending.append((values, data))
+            self._pending_bytes += len(data)
+            if len(self._pending) >= self.flush_rows or self._pending_bytes >= self.flush_bytes:
+                self._flush_needed.notify()
 
     def get_sessions(self, session_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Get sessions from the CSV storage.
 
+        Lookups by session ID use the offset index and only read the
+        matching rows.
+
         Args:
             session_id: Optional session ID to filter by
             limit: Maximum number of sessions to return
@@ -73,36 +1205,147 @@ class CSVAgentStorage:
         Returns:
             List of sessions
         """
+        return [row.to_dict() for row in islice(self.iter_sessions(session_id=session_id), limit)]
+
+    def iter_sessions(self, session_id: Optional[str] = None,
+                      since: Union[str, datetime.datetime, None] = None,
+                      until: Union[str, datetime.datetime, None] = None,
+                      columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream sessions from the CSV storage in the order they were saved.
+
+        Rows are read one at a time and metadata is only decoded when a
+        row's ``metadata`` is accessed, so memory use stays constant
+        regardless of the table size. Sealed segments outside the requested
+        time range are skipped without being opened. In sharded mode, the
+        shards are merged by timestamp.
+
+        Args:
+            session_id: Optional session ID to filter by (uses the offset index)
+            since: Only include sessions saved at or after this time
+            until: Only include sessions saved before this time
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        since, until = _timestamp_bound(since), _timestamp_bound(until)
+
+        with self._reading(session_id) as sources:
+            yield from _merge_rows(sources, session_id, since, until, columns)
+
+    def _iter_since(self, since: str, columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream the sessions saved at or after a time, oldest first.
+
+        Every file is read backwards from its end, and only until a row
+        older than ``since``, so the cost depends on the number of rows
+        returned rather than on the size of the table.
+
+        Args:
+            since: ISO timestamp of the oldest row to include
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        with self._reading() as sources:
+            streams = [
+                list(takewhile(
+                    lambda values: values[1] >= since,
+                    (values for values in source.iter_values_reverse() if len(values) >= 2)
+                ))[::-1]
+                for source in sources
+            ]
+        rows = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=_timestamp_key)
+        for values in rows:
+            yield _make_row(values, columns)
+
+    def get_recent_rows(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the most recently saved session rows, newest first.
+
+        The active CSV file is read backwards from the end, so the cost only
+        depends on the number of sessions requested, not on the size of the
+        table. Sealed segments are only read when the active one runs out.
+
+        Args:
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of sessions, newest first
+        """
         sessions = []
+        if limit <= 0:
+            return sessions
 
-        try:
-            with open(self.csv_path, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if session_id is None or row['session_id'] == session_id:
-                        # Parse metadata from JSON string
-                        try:
-                            metadata = json.loads(row['metadata'])
-                        except json.JSONDecodeError:
-                            metadata = {}
-
-                        sessions.append({
-                            'session_id': row['session_id'],
-                            'timestamp': row['timestamp'],
-                            'input': row['input'],
-                            'response': row['response'],
-                            'metadata': metadata
-                        })
-
-                        if len(sessions) >= limit:
-                            break
-        except FileNotFoundError:
-            # Return empty list if file doesn't exist
-            pass
+        with self._reading() as sources:
+            streams = [
+                (values for values in source.iter_values_reverse() if len(values) >= 2)
+                for source in sources
+            ]
+            if len(streams) == 1:
+                rows = streams[0]
+            else:
+                rows = heapq.merge(*streams, key=_timestamp_key, reverse=True)
+
+            for values in islice(rows, limit):
+                sessions.append(_make_row(values).to_dict())
 
         return sessions
 
     def get_latest_session(self) -> Optional[Dict[str, Any]]:
         """Get the latest session from the CSV storage."""
-        sessions = self.get_sessions(limit=1)
-        return sessions[0] if sessions else None
\ No newline at end of file
+        sessions = self.get_recent_rows(limit=1)
+        return sessions[0] if sessions else None
+
+    def _latest_values(self, session_id: str) -> Optional[List[str]]:
+        """Return the newest row saved for a session, across segments and shards."""
+        with self._reading(session_id) as sources:
+            candidates = [source.last_values(session_id) for source in sources]
+        candidates = [values for values in candidates if values and len(values) >= 2]
+        return max(candidates, key=_timestamp_key, default=None)
+
+    def _sessions(self) -> "CSVAgentStorage":
+        """Return the companion table that stores agno sessions, opening it on first use."""
+        with self._lock:
+            if self._session_table is None:
+                self._session_table = CSVAgentStorage(
+                    f"{self.table_name}.sessions", self.csv_dir, **self._settings
+                )
+            return self._session_table
+
+    def drop(self) -> None:
+        """Delete every file of this table, including all shards, segments and sessions."""
+        with self._lock:
+            if self._session_table is not None:
+                self._session_table.drop()
+                self._session_table.close()
+                self._session_table = None
+            self._session_owners = None
+
+            pattern = re.compile(
+                re.escape(self.table_name) +
+                r"(\.\d+)?\.(csv|idx|manifest\.json|seg\d+\.(csv|csv\.gz|idx))(\.tmp)?$"
+            )
+            for name in os.listdir(self.csv_dir):
+                if pattern.match(name):
+                    os.remove(os.path.join(self.csv_dir, name))
+
+            self._pending = []
+            self._pending_bytes = 0
+            self._segments = []
+            self._retired = []
+            self._next_seq = 1
+            self._active_created = time.time()
+            with open(self.csv_path, 'wb') as f:
+                f.write(_encode_row(FIELDNAMES))
+            self._data_start = self._end = os.path.getsize(self.csv_path)
+            self._index = {}
+            _write_index_file(self.index_path, [])
+
+        if self.max_segment_bytes is None and self.max_segment_age is None:
+            return
+        self._save_manifest()
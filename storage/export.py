@@ -0,0 +1,327 @@
+"""
+Columnar analytics export of agent session storage.
+
+Sessions are written to chunked, compressed Parquet files with the JSON
+metadata flattened into typed columns, so dashboards can load only the
+columns they aggregate instead of parsing every CSV row.
+
+Usage:
+    python -m storage.export export --csv-dir storage/csv --output-dir storage/analytics
+    python -m storage.export stats --output-dir storage/analytics --metric metadata.latency
+"""
+import os
+import re
+import json
+import shutil
+import argparse
+import datetime
+from typing import Dict, List, Optional, Any, Iterable, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from storage.csv_storage import CSVTableReader
+
+# Prefix of the columns holding flattened metadata fields
+METADATA_PREFIX = "metadata."
+
+# Table files written by CSVAgentStorage: <table>.csv or a <table>.<pid>.csv shard
+_TABLE_FILE = re.compile(r"(?P<table>.+?)(\.\d+)?\.csv$")
+
+
+def list_tables(csv_dir: str = "storage/csv") -> List[str]:
+    """
+    List the CSV storage tables in a directory.
+
+    Args:
+        csv_dir: Directory holding the CSV tables
+
+    Returns:
+        Sorted table names
+    """
+    tables = set()
+    for name in os.listdir(csv_dir):
+        match = _TABLE_FILE.match(name)
+        if match and ".seg" not in name and match.group('table') != "sessions.log":
+            tables.add(match.group('table'))
+    return sorted(tables)
+
+
+def _flatten(value: Any, prefix: str, out: Dict[str, Any]) -> None:
+    """Flatten nested dictionaries into dotted keys; lists are kept as JSON strings."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, f"{prefix}.{key}", out)
+    elif isinstance(value, (list, tuple)):
+        out[prefix] = json.dumps(value)
+    else:
+        out[prefix] = value
+
+
+def _to_array(values: List[Any]) -> pa.Array:
+    """Build a typed Arrow array, falling back to strings when the values have mixed types."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+
+def _chunk_table(rows: List[Any], include_text: bool) -> pa.Table:
+    """Convert a chunk of session rows into an Arrow table."""
+    columns: Dict[str, List[Any]] = {
+        'session_id': [],
+        'timestamp': [],
+        'input_length': [],
+        'response_length': [],
+    }
+    if include_text:
+        columns['input'] = []
+        columns['response'] = []
+
+    metadata: List[Dict[str, Any]] = []
+    for row in rows:
+        columns['session_id'].append(row.session_id)
+        columns['timestamp'].append(row.timestamp)
+        columns['input_length'].append(len(row.input or ""))
+        columns['response_length'].append(len(row.response or ""))
+        if include_text:
+            columns['input'].append(row.input)
+            columns['response'].append(row.response)
+        fields: Dict[str, Any] = {}
+        _flatten(row.metadata, METADATA_PREFIX.rstrip('.'), fields)
+        metadata.append(fields)
+
+    arrays = {
+        'session_id': pa.array(columns.pop('session_id'), pa.string()),
+        'timestamp': pa.array(
+            [datetime.datetime.fromisoformat(value) for value in columns.pop('timestamp')],
+            pa.timestamp('us')
+        ),
+    }
+    arrays.update({name: _to_array(values) for name, values in columns.items()})
+
+    names = sorted({name for fields in metadata for name in fields})
+    for name in names:
+        arrays[name] = _to_array([fields.get(name) for fields in metadata])
+
+    return pa.Table.from_pydict(arrays)
+
+
+def export_sessions(storage: Any, output_dir: str = "storage/analytics",
+                    chunk_rows: int = 50000,
+                    compression: str = "zstd",
+                    include_text: bool = True) -> List[str]:
+    """
+    Export one session table to chunked Parquet files.
+
+    Sessions are streamed from the storage, so memory use is bounded by
+    the chunk size. The export replaces any previous export of the table.
+
+    Args:
+        storage: Session storage to read (any backend with ``iter_sessions``)
+        output_dir: Directory to write the export to
+        chunk_rows: Number of sessions per Parquet file
+        compression: Parquet compression codec
+        include_text: Include the full input and response text columns
+
+    Returns:
+        Paths of the written Parquet files
+    """
+    table_dir = os.path.join(output_dir, storage.table_name)
+    tmp_dir = table_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    names = []
+    chunk = []
+    rows = iter(storage.iter_sessions())
+    while True:
+        row = next(rows, None)
+        if row is not None:
+            chunk.append(row)
+        if chunk and (row is None or len(chunk) >= chunk_rows):
+            name = f"part-{len(names):05d}.parquet"
+            pq.write_table(_chunk_table(chunk, include_text), os.path.join(tmp_dir, name),
+                           compression=compression)
+            names.append(name)
+            chunk = []
+        if row is None:
+            break
+
+    # Swap the finished export in, so readers never see a partial one
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+    return [os.path.join(table_dir, name) for name in names]
+
+
+def export_tables(csv_dir: str = "storage/csv", output_dir: str = "storage/analytics",
+                  tables: Optional[Iterable[str]] = None,
+                  sharded: bool = False,
+                  **kwargs) -> Dict[str, List[str]]:
+    """
+    Export CSV storage tables to Parquet.
+
+    Tables are read without creating or modifying any file in csv_dir.
+
+    Args:
+        csv_dir: Directory holding the CSV tables
+        output_dir: Directory to write the export to
+        tables: Optional table names (all tables in csv_dir by default)
+        sharded: Read the tables in sharded mode, merging every process shard
+        **kwargs: Options passed on to export_sessions
+
+    Returns:
+        Mapping of table name to the written Parquet files
+
+    Raises:
+        FileNotFoundError: If a requested table does not exist, or only has shards when sharded is False
+    """
+    readers = [
+        CSVTableReader(table_name, csv_dir, sharded=sharded)
+        for table_name in (tables if tables is not None else list_tables(csv_dir))
+    ]
+    return {reader.table_name: export_sessions(reader, output_dir, **kwargs) for reader in readers}
+
+
+def read_sessions(output_dir: str = "storage/analytics",
+                  table_name: Optional[str] = None,
+                  columns: Optional[Iterable[str]] = None,
+                  since: Union[str, datetime.datetime, None] = None,
+                  until: Union[str, datetime.datetime, None] = None) -> pd.DataFrame:
+    """
+    Load exported sessions, reading only the requested columns.
+
+    Row groups outside the time range are skipped using the Parquet
+    statistics. Chunks exported without one of the requested columns
+    contribute missing values for it.
+
+    Args:
+        output_dir: Directory holding the export
+        table_name: Optional table to read (all exported tables by default)
+        columns: Optional columns to load, e.g. ``["response_length", "metadata.latency"]``
+        since: Only include sessions saved at or after this time
+        until: Only include sessions saved before this time
+
+    Returns:
+        DataFrame with a ``table`` column followed by the requested columns
+    """
+    if isinstance(since, str):
+        since = datetime.datetime.fromisoformat(since)
+    if isinstance(until, str):
+        until = datetime.datetime.fromisoformat(until)
+    filters = []
+    if since is not None:
+        filters.append(('timestamp', '>=', since))
+    if until is not None:
+        filters.append(('timestamp', '<', until))
+
+    tables = [table_name] if table_name is not None else sorted(
+        name for name in os.listdir(output_dir)
+        if os.path.isdir(os.path.join(output_dir, name)) and not name.endswith(".tmp")
+    )
+    columns = list(columns) if columns is not None else None
+
+    frames = []
+    for table in tables:
+        table_dir = os.path.join(output_dir, table)
+        for name in sorted(os.listdir(table_dir)):
+            path = os.path.join(table_dir, name)
+            available = pq.read_schema(path).names
+            wanted = available if columns is None else [column for column in columns if column in available]
+            if filters and 'timestamp' not in wanted:
+                wanted = wanted + ['timestamp']
+                drop_timestamp = True
+            else:
+                drop_timestamp = False
+            frame = pq.read_table(path, columns=wanted, filters=filters or None).to_pandas()
+            if drop_timestamp:
+                frame = frame.drop(columns=['timestamp'])
+            frame.insert(0, 'table', table)
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['table'] + (columns or []))
+    result = pd.concat(frames, ignore_index=True)
+    if columns is not None:
+        result = result.reindex(columns=['table'] + columns)
+    return result
+
+
+def session_stats(output_dir: str = "storage/analytics",
+                  metrics: Iterable[str] = ("response_length",),
+                  **kwargs) -> pd.DataFrame:
+    """
+    Compute per-table aggregate statistics over exported sessions.
+
+    Args:
+        output_dir: Directory holding the export
+        metrics: Numeric columns to aggregate
+        **kwargs: Options passed on to read_sessions (table_name, since, until)
+
+    Returns:
+        DataFrame indexed by table, with the session count and the
+        mean, median and maximum of every metric
+    """
+    metrics = list(metrics)
+    frame = read_sessions(output_dir, columns=['session_id'] + metrics, **kwargs)
+    grouped = frame.groupby('table')
+    stats = grouped.agg(rows=('session_id', 'size'), sessions=('session_id', 'nunique'))
+    for metric in metrics:
+        values = pd.to_numeric(frame[metric], errors='coerce').groupby(frame['table'])
+        stats[f"{metric}_mean"] = values.mean()
+        stats[f"{metric}_median"] = values.median()
+        stats[f"{metric}_max"] = values.max()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Export agent sessions to Parquet and query them")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export CSV tables to Parquet")
+    export_parser.add_argument("tables", nargs="*", help="Tables to export (all by default)")
+    export_parser.add_argument("--csv-dir", default="storage/csv", help="Directory holding the CSV tables")
+    export_parser.add_argument("--output-dir", default="storage/analytics", help="Directory to write the export to")
+    export_parser.add_argument("--chunk-rows", type=int, default=50000, help="Sessions per Parquet file")
+    export_parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    export_parser.add_argument("--no-text", action="store_true", help="Leave out the input and response text")
+    export_parser.add_argument("--sharded", action="store_true", help="Merge the per-process shards of each table")
+
+    stats_parser = commands.add_parser("stats", help="Print per-table session statistics")
+    stats_parser.add_argument("--output-dir", default="storage/analytics", help="Directory holding the export")
+    stats_parser.add_argument("--table", help="Only include this table")
+    stats_parser.add_argument("--metric", action="append", help="Numeric column to aggregate (repeatable)")
+    stats_parser.add_argument("--since", help="Only include sessions saved at or after this ISO time")
+    stats_parser.add_argument("--until", help="Only include sessions saved before this ISO time")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        try:
+            exported = export_tables(
+                args.csv_dir, args.output_dir,
+                tables=args.tables or None,
+                sharded=args.sharded,
+                chunk_rows=args.chunk_rows,
+                compression=args.compression,
+                include_text=not args.no_text
+            )
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        for table_name, paths in exported.items():
+            print(f"{table_name}: {len(paths)} file(s)")
+    else:
+        stats = session_stats(
+            args.output_dir,
+            metrics=args.metric or ["response_length"],
+            table_name=args.table,
+            since=args.since,
+            until=args.until
+        )
+        print(stats.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Lightweight row objects shared by the session storage backends.
+"""
+import json
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+COLUMNS = ('session_id', 'timestamp', 'input', 'response', 'metadata')
+
+
+def normalize_columns(columns: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """
+    Validate a column projection.
+
+    Args:
+        columns: Column names to keep, or None for all columns
+
+    Returns:
+        Tuple of column names in storage order
+    """
+    if columns is None:
+        return COLUMNS
+    columns = set(columns)
+    unknown = columns - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown session columns: {', '.join(sorted(unknown))}")
+    return tuple(column for column in COLUMNS if column in columns)
+
+
+class SessionRow:
+    """
+    A single stored session with lazily decoded metadata.
+
+    Metadata is kept as the raw JSON string and only parsed the first time
+    it is accessed. Rows support both attribute access and dict-style access
+    so they can be used wherever session dictionaries are expected.
+    """
+    __slots__ = ('session_id', 'timestamp', 'input', 'response', '_metadata_json', '_metadata')
+
+    def __init__(self, values: Dict[str, Any]):
+        """
+        Initialize the row.
+
+        Args:
+            values: Raw column values; columns left out of a projection are omitted
+        """
+        for column in ('session_id', 'timestamp', 'input', 'response'):
+            if column in values:
+                setattr(self, column, values[column])
+        if 'metadata' in values:
+            self._metadata_json = values['metadata']
+            self._metadata = None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """The session metadata, decoded from JSON on first access."""
+        if self._metadata is None:
+            try:
+                self._metadata = json.loads(self._metadata_json or '{}')
+            except json.JSONDecodeError:
+                self._metadata = {}
+        return self._metadata
+
+    @property
+    def raw_metadata(self) -> str:
+        """The metadata column exactly as stored, without decoding it."""
+        return self._metadata_json
+
+    def keys(self) -> Tuple[str, ...]:
+        """Return the columns present in this row."""
+        return tuple(column for column in COLUMNS if column in self)
+
+    def __contains__(self, column: str) -> bool:
+        slot = '_metadata_json' if column == 'metadata' else column
+        return column in COLUMNS and hasattr(self, slot)
+
+    def __getitem__(self, column: str) -> Any:
+        if column not in self:
+            raise KeyError(column)
+        return getattr(self, column)
+
+    def get(self, column: str, default: Any = None) -> Any:
+        """Return a column value, or default if the column is not present."""
+        return self[column] if column in self else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the row as a plain session dictionary."""
+        return {column: self[column] for column in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"SessionRow(session_id={self.get('session_id')!r}, timestamp={self.get('timestamp')!r})"
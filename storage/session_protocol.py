@@ -0,0 +1,233 @@
+"""
+agno storage protocol shared by the session storage backends.
+"""
+import json
+import time
+import datetime
+from typing import Dict, List, Optional, Any
+
+# Metadata column value marking a deleted agno session
+_TOMBSTONE = 'null'
+
+# Seconds of rows before the newest one seen that a refresh of the owner map reads
+# again, so rows other writers timestamped just before it and appended after it are not missed
+_REFRESH_OVERLAP = 5.0
+
+# Columns needed to track session owners
+_OWNER_COLUMNS = ('session_id', 'timestamp', 'input', 'response', 'metadata')
+
+# Modules and class names of the agno session types, by storage mode and agno version
+_SESSION_CLASSES = {
+    'agent': [('agno.storage.session.agent', 'AgentSession'), ('agno.storage.agent.session', 'AgentSession')],
+    'workflow': [('agno.storage.session.workflow', 'WorkflowSession'),
+                 ('agno.storage.workflow.session', 'WorkflowSession')],
+}
+
+
+class AgnoSessionProtocol:
+    """
+    Mixin implementing the agno storage protocol (``read``, ``upsert``,
+    ``get_all_session_ids``, ``get_recent_sessions``, ...) on top of a
+    session table.
+
+    Agent sessions live in a companion table returned by ``_sessions()``:
+    each upsert appends one row, whose ``input`` and ``response`` columns
+    hold the user and agent IDs and whose metadata is the serialized session.
+    An in-memory map of session IDs to owners is built on first use, kept
+    current by ``upsert`` and refreshed with the rows other storages
+    appended since; session bodies are only read and decoded by ``read``.
+
+    Subclasses provide ``_lock``, ``_session_owners`` (initially None),
+    ``mode`` and ``_sessions()``. The companion table must implement
+    ``_append``, ``_latest_values``, ``iter_sessions`` and ``_iter_since``.
+    """
+    def _sessions(self) -> Any:
+        """Return the companion table that stores agno sessions."""
+        raise NotImplementedError
+
+    def _owners(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return the map of live session IDs to their user and agent IDs.
+
+        The map is built with one pass over the sessions table that never
+        decodes session bodies. Later calls only read the rows appended
+        since (by this or any other storage of the table), reading again
+        the last few seconds before the newest row seen. Entries are
+        ordered from least to most recently updated.
+        """
+        with self._lock:
+            if self._session_owners is None:
+                self._session_owners = {}
+                self._owners_seen = None
+                rows = self._sessions().iter_sessions(columns=_OWNER_COLUMNS)
+            elif self._owners_seen is not None:
+                since = datetime.datetime.fromisoformat(self._owners_seen) - \
+                    datetime.timedelta(seconds=_REFRESH_OVERLAP)
+                rows = self._sessions()._iter_since(since.isoformat(), columns=_OWNER_COLUMNS)
+            else:
+                rows = self._sessions().iter_sessions(columns=_OWNER_COLUMNS)
+
+            owners = self._session_owners
+            for row in rows:
+                previous = owners.pop(row.session_id, None)
+                if row.raw_metadata != _TOMBSTONE:
+                    owners[row.session_id] = {'user_id': row.input or None, 'agent_id': row.response or None}
+                    if previous is not None and 'created_at' in previous:
+                        owners[row.session_id]['created_at'] = previous['created_at']
+                if row.timestamp and (self._owners_seen is None or row.timestamp > self._owners_seen):
+                    self._owners_seen = row.timestamp
+            return owners
+
+    def _to_session(self, data: Dict[str, Any]) -> Any:
+        """Convert a stored session dictionary into the agno session type for this mode."""
+        for module_name, class_name in _SESSION_CLASSES.get(self.mode, []):
+            try:
+                module = __import__(module_name, fromlist=[class_name])
+            except ImportError:
+                continue
+            return getattr(module, class_name).from_dict(data)
+        return data
+
+    def create(self) -> None:
+        """Create the storage files if they do not exist yet."""
+        self._sessions()
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[Any]:
+        """
+        Read an agno session.
+
+        Only the newest row of the session is read and decoded.
+
+        Args:
+            session_id: Session ID to read
+            user_id: Optional user ID the session must belong to
+
+        Returns:
+            The session, or None if it does not exist
+        """
+        data = self._read_session_data(session_id, user_id)
+        return self._to_session(data) if data is not None else None
+
+    def _read_session_data(self, session_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Read and decode the newest stored body of an agno session."""
+        values = self._sessions()._latest_values(session_id)
+        if values is None or len(values) < 5 or values[4] == _TOMBSTONE:
+            return None
+        if user_id is not None and values[2] != user_id:
+            return None
+        try:
+            return json.loads(values[4])
+        except json.JSONDecodeError:
+            return None
+
+    def get_all_session_ids(self, user_id: Optional[str] = None,
+                            entity_id: Optional[str] = None) -> List[str]:
+        """
+        List the IDs of all stored agno sessions, most recently updated first.
+
+        Args:
+            user_id: Optional user ID to filter by
+            entity_id: Optional agent or workflow ID to filter by
+
+        Returns:
+            List of session IDs
+        """
+        with self._lock:
+            owners = list(self._owners().items())
+        return [
+            session_id for session_id, owner in reversed(owners)
+            if (user_id is None or owner['user_id'] == user_id)
+            and (entity_id is None or owner['agent_id'] == entity_id)
+        ]
+
+    def get_all_sessions(self, user_id: Optional[str] = None,
+                         entity_id: Optional[str] = None) -> List[Any]:
+        """
+        Read all stored agno sessions, most recently updated first.
+
+        Args:
+            user_id: Optional user ID to filter by
+            entity_id: Optional agent or workflow ID to filter by
+
+        Returns:
+            List of sessions
+        """
+        return self.get_recent_sessions(user_id=user_id, entity_id=entity_id, limit=None)
+
+    def get_recent_sessions(self, user_id: Optional[str] = None,
+                            entity_id: Optional[str] = None,
+                            limit: Optional[int] = 2) -> List[Any]:
+        """
+        Read the most recently updated agno sessions, newest first.
+
+        Only the sessions returned are read and decoded.
+
+        Args:
+            user_id: Optional user ID to filter by
+            entity_id: Optional agent or workflow ID to filter by
+            limit: Maximum number of sessions to return (None for all)
+
+        Returns:
+            List of sessions
+        """
+        sessions = []
+        for session_id in self.get_all_session_ids(user_id=user_id, entity_id=entity_id):
+            if limit is not None and len(sessions) >= limit:
+                break
+            session = self.read(session_id)
+            if session is not None:
+                sessions.append(session)
+        return sessions
+
+    def upsert(self, session: Any) -> Optional[Any]:
+        """
+        Insert or update an agno session.
+
+        Each call appends a single row, so the cost does not depend on how
+        many sessions or updates are already stored. Compaction later drops
+        the superseded rows.
+
+        Args:
+            session: Session object (anything with ``to_dict()``) or dictionary
+
+        Returns:
+            The stored session
+        """
+        data = dict(session.to_dict() if hasattr(session, 'to_dict') else session)
+        session_id = data['session_id']
+        now = int(time.time())
+
+        with self._lock:
+            owners = self._owners()
+            owner = owners.pop(session_id, None)
+            created_at = (owner or {}).get('created_at') or data.get('created_at')
+            if created_at is None and owner is not None:
+                # Known session whose creation time has not been cached yet
+                previous = self._read_session_data(session_id)
+                created_at = previous.get('created_at') if previous else None
+
+            data['created_at'] = created_at or now
+            data['updated_at'] = now
+            user_id = data.get('user_id') or ''
+            agent_id = data.get('agent_id') or data.get('workflow_id') or ''
+            self._sessions()._append(session_id, user_id, agent_id, json.dumps(data, default=str))
+            owners[session_id] = {'user_id': user_id or None, 'agent_id': agent_id or None,
+                                  'created_at': data['created_at']}
+
+        return self._to_session(data)
+
+    def delete_session(self, session_id: Optional[str] = None) -> None:
+        """
+        Delete an agno session by appending a tombstone row.
+
+        Args:
+            session_id: Session ID to delete
+        """
+        if session_id is None:
+            return
+        with self._lock:
+            self._sessions()._append(session_id, '', '', _TOMBSTONE)
+            self._owners().pop(session_id, None)
+
+    def upgrade_schema(self) -> None:
+        """No-op: the session tables have no schema versions to migrate."""
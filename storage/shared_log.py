@@ -0,0 +1,462 @@
+"""
+Shared append-only log storage for all agent tables.
+"""
+import os
+import csv
+import json
+import uuid
+import atexit
+import datetime
+import threading
+from itertools import islice, takewhile
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Union
+
+from storage.csv_storage import (
+    FIELDNAMES,
+    _decode_record,
+    _encode_row,
+    _file_lock,
+    _find_data_start,
+    _iter_records,
+    _iter_rows_at,
+    _make_row,
+    _timestamp_bound,
+)
+from storage.rows import SessionRow, normalize_columns
+from storage.session_protocol import AgnoSessionProtocol
+
+LOG_FIELDNAMES = ['table'] + FIELDNAMES
+
+# Session ID of the marker row appended when a table is dropped
+_DROP_MARKER = ''
+
+# One engine per log directory, shared by every storage that writes to it
+_ENGINES: Dict[str, "SharedLogEngine"] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_shared_log(log_dir: str = "storage/csv") -> "SharedLogEngine":
+    """
+    Return the shared log engine for a directory, creating it on first use.
+
+    Args:
+        log_dir: Directory holding the shared log
+
+    Returns:
+        The engine registered for the directory
+    """
+    key = os.path.abspath(log_dir)
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = _ENGINES[key] = SharedLogEngine(log_dir)
+        return engine
+
+
+@atexit.register
+def _close_shared_logs() -> None:
+    """Close the file handles of every registered engine."""
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.close()
+
+
+class _TableIndex:
+    """Offsets of one table's rows in the shared log."""
+    __slots__ = ('offsets', 'sessions')
+
+    def __init__(self):
+        self.offsets: List[int] = []
+        self.sessions: Dict[str, List[int]] = {}
+
+    def add(self, session_id: str, offset: int) -> None:
+        self.offsets.append(offset)
+        self.sessions.setdefault(session_id, []).append(offset)
+
+
+class SharedLogEngine:
+    """
+    Single append-only log holding the sessions of every agent table.
+
+    Each record is a CSV row tagged with its table name. One writer handle
+    is kept open for the lifetime of the engine, and a sidecar index
+    (``sessions.log.idx``) records the table, session ID and byte offset of
+    every row so per-table reads seek straight to their rows. Reading the
+    whole log, for example every agent's sessions during a workflow run,
+    is a single sequential scan. Appends from several processes are
+    serialized with a lock on the log file.
+    """
+    def __init__(self, log_dir: str = "storage/csv"):
+        """
+        Initialize the shared log.
+
+        Args:
+            log_dir: Directory to store the log and its index in
+        """
+        self.log_dir = log_dir
+        self.log_path = os.path.join(log_dir, "sessions.log.csv")
+        self.index_path = os.path.join(log_dir, "sessions.log.idx")
+        self._lock = threading.RLock()
+        self._tables: Dict[str, _TableIndex] = {}
+        self._dropped: Dict[str, int] = {}
+
+        # Create directory if it doesn't exist
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._log = open(self.log_path, 'ab')
+        with _file_lock(self._log):
+            if not self._log.seek(0, os.SEEK_END):
+                self._log.write(_encode_row(LOG_FIELDNAMES))
+                self._log.flush()
+
+            with open(self.log_path, 'rb') as f:
+                self._data_start = _find_data_start(f)
+            self._load_index()
+            self._end = self._log.seek(0, os.SEEK_END)
+
+        self._index_file = open(self.index_path, 'a', newline='', encoding='utf-8')
+        self._index_writer = csv.writer(self._index_file)
+
+    def _load_index(self) -> None:
+        """
+        Load the sidecar index, indexing rows it is missing and rebuilding it if stale.
+
+        Called with the log file locked, so no other process appends meanwhile.
+        """
+        entries: List[Tuple[str, str, int]] = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', newline='', encoding='utf-8') as f:
+                entries = [(row[0], row[1], int(row[2])) for row in csv.reader(f) if len(row) == 3]
+
+        start = self._data_start
+        if entries:
+            table, session_id, offset = entries[-1]
+            values = []
+            if offset < os.path.getsize(self.log_path):
+                with open(self.log_path, 'rb') as f:
+                    values = _decode_record(next(_iter_records(f, offset), (0, b""))[1])
+            if values[:2] == [table, session_id]:
+                start = offset
+            else:
+                entries = []
+
+        with open(self.log_path, 'rb') as f:
+            missing = [
+                (values[0], values[1], offset)
+                for offset, values in ((offset, _decode_record(record)) for offset, record in _iter_records(f, start))
+                if len(values) >= 2 and (not entries or offset != start)
+            ]
+
+        if not entries:
+            # Rewritten in place rather than replaced, as other processes keep the index open for appending
+            with open(self.index_path, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(missing)
+        elif missing:
+            with open(self.index_path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(missing)
+
+        for table, session_id, offset in entries + missing:
+            self._add(table, session_id, offset)
+
+    def _add(self, table: str, session_id: str, offset: int) -> None:
+        """Add one log row to the in-memory index; a drop marker resets its table."""
+        if session_id == _DROP_MARKER:
+            self._tables.pop(table, None)
+            self._dropped[table] = offset
+            return
+        index = self._tables.get(table)
+        if index is None:
+            index = self._tables[table] = _TableIndex()
+        index.add(session_id, offset)
+
+    def tables(self) -> List[str]:
+        """Return the names of all tables with rows in the log."""
+        with self._lock:
+            self._index_tail()
+            return sorted(self._tables)
+
+    def append(self, table: str, values: List[str]) -> None:
+        """
+        Append one row to the log.
+
+        Args:
+            table: Table the row belongs to
+            values: Row values in FIELDNAMES order
+        """
+        data = _encode_row([table] + values)
+        # The file lock also serializes appends to the shared index file
+        with self._lock, _file_lock(self._log):
+            # Other processes may have appended since our last write
+            offset = self._log.seek(0, os.SEEK_END)
+            self._index_tail(offset)
+            self._log.write(data)
+            self._log.flush()
+            self._index_writer.writerow((table, values[0], offset))
+            self._index_file.flush()
+            self._end = offset + len(data)
+            self._add(table, values[0], offset)
+
+    def _index_tail(self, end: Optional[int] = None) -> None:
+        """
+        Index rows that other processes appended to the log since this
+        engine last wrote or read it.
+
+        The rows are only added to the in-memory index, since their writer
+        records them in the sidecar index. A partially written row at the
+        end of the log is left for the next call.
+
+        Args:
+            end: Optional byte offset up to which to index (defaults to the log size)
+        """
+        if end is None:
+            end = os.path.getsize(self.log_path)
+        if end <= self._end:
+            return
+        with open(self.log_path, 'rb') as f:
+            for offset, record in _iter_records(f, self._end, end):
+                if offset + len(record) > end or not record.endswith(b"\n") or record.count(b'"') % 2:
+                    break
+                values = _decode_record(record)
+                if len(values) >= 2:
+                    self._add(values[0], values[1], offset)
+                self._end = offset + len(record)
+
+    def _snapshot(self, table: str, session_id: Optional[str] = None) -> List[int]:
+        """Copy the offsets of a table's rows (or of one session's rows) under the lock."""
+        with self._lock:
+            self._index_tail()
+            index = self._tables.get(table)
+            if index is None:
+                return []
+            if session_id is not None:
+                return list(index.sessions.get(session_id, []))
+            return list(index.offsets)
+
+    def iter_table(self, table: str, session_id: Optional[str] = None,
+                   reverse: bool = False) -> Iterator[List[str]]:
+        """
+        Iterate over one table's rows, without the table column.
+
+        Args:
+            table: Table to read
+            session_id: Optional session ID to filter by
+            reverse: Yield the newest rows first
+
+        Yields:
+            Row values in FIELDNAMES order
+        """
+        offsets = self._snapshot(table, session_id)
+        if reverse:
+            offsets.reverse()
+        with open(self.log_path, 'rb') as f:
+            for values in _iter_rows_at(f, offsets, table):
+                if session_id is None or values[1:2] == [session_id]:
+                    yield values[1:]
+
+    def iter_records(self, tables: Optional[Iterable[str]] = None,
+                     since: Union[str, datetime.datetime, None] = None,
+                     until: Union[str, datetime.datetime, None] = None,
+                     columns: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, SessionRow]]:
+        """
+        Stream rows of every table in the order they were written, with one sequential read.
+
+        Args:
+            tables: Optional table names to include
+            since: Only include sessions saved at or after this time
+            until: Only include sessions saved before this time
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Tuples of (table name, lazy session row)
+        """
+        tables = set(tables) if tables is not None else None
+        since, until = _timestamp_bound(since), _timestamp_bound(until)
+        columns = normalize_columns(columns)
+
+        with self._lock:
+            self._index_tail()
+            end = self._end
+            dropped = dict(self._dropped)
+        with open(self.log_path, 'rb') as f:
+            for offset, record in _iter_records(f, self._data_start, end):
+                values = _decode_record(record)
+                if len(values) < 3 or values[1] == _DROP_MARKER or offset < dropped.get(values[0], -1):
+                    continue
+                if tables is not None and values[0] not in tables:
+                    continue
+                if (since is not None and values[2] < since) or (until is not None and values[2] >= until):
+                    continue
+                yield values[0], _make_row(values[1:], columns)
+
+    def drop_table(self, table: str) -> None:
+        """
+        Drop a table by appending a marker row.
+
+        The table's earlier rows stay in the log but are skipped by every
+        read, including after a restart.
+
+        Args:
+            table: Table to drop
+        """
+        timestamp = datetime.datetime.now().isoformat()
+        self.append(table, [_DROP_MARKER, timestamp, '', '', 'null'])
+
+    def close(self) -> None:
+        """Close the writer handles."""
+        with self._lock:
+            if not self._log.closed:
+                self._log.close()
+                self._index_file.close()
+
+
+class SharedLogAgentStorage(AgnoSessionProtocol):
+    """
+    Storage for one agent table inside a shared append-only log.
+    Drop-in replacement for CSVAgentStorage.
+
+    Every storage created for the same directory shares one
+    SharedLogEngine, so all agents of a workflow append through a single
+    writer and file handle instead of one CSV file each.
+    """
+    def __init__(self, table_name: str, log_dir: str = "storage/csv"):
+        """
+        Initialize the shared log storage.
+
+        Args:
+            table_name: Name of the table to tag rows with
+            log_dir: Directory holding the shared log
+        """
+        self.table_name = table_name
+        self.log_dir = log_dir
+        self.engine = get_shared_log(log_dir)
+        self.mode = "agent"
+        self._lock = threading.RLock()
+        self._session_table: Optional["SharedLogAgentStorage"] = None
+        self._session_owners: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def save_session(self, session_id: Optional[str] = None,
+                     input_text: str = "",
+                     response: str = "",
+                     metadata: Dict[str, Any] = None) -> str:
+        """
+        Save a session to the shared log.
+
+        Args:
+            session_id: Optional session ID (will be generated if not provided)
+            input_text: Input text for the session
+            response: Response text for the session
+            metadata: Additional metadata for the session
+
+        Returns:
+            The session ID
+        """
+        if session_id is None:
+            session_id = str(uuid.uuid4())
+
+        self._append(session_id, input_text, response, json.dumps(metadata or {}))
+        return session_id
+
+    def _append(self, session_id: str, input_text: str, response: str, metadata_json: str) -> None:
+        """Append one row with the current timestamp."""
+        timestamp = datetime.datetime.now().isoformat()
+        self.engine.append(self.table_name, [session_id, timestamp, input_text, response, metadata_json])
+
+    def get_sessions(self, session_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get sessions from the shared log.
+
+        Args:
+            session_id: Optional session ID to filter by
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of sessions
+        """
+        return [row.to_dict() for row in islice(self.iter_sessions(session_id=session_id), limit)]
+
+    def iter_sessions(self, session_id: Optional[str] = None,
+                      since: Union[str, datetime.datetime, None] = None,
+                      until: Union[str, datetime.datetime, None] = None,
+                      columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream this table's sessions in the order they were saved.
+
+        Args:
+            session_id: Optional session ID to filter by
+            since: Only include sessions saved at or after this time
+            until: Only include sessions saved before this time
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        since, until = _timestamp_bound(since), _timestamp_bound(until)
+        for values in self.engine.iter_table(self.table_name, session_id):
+            if (since is not None and values[1] < since) or (until is not None and values[1] >= until):
+                continue
+            yield _make_row(values, columns)
+
+    def _iter_since(self, since: str, columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream this table's sessions saved at or after a time, oldest first.
+
+        The table's rows are read newest first, and only until a row older
+        than ``since``.
+
+        Args:
+            since: ISO timestamp of the oldest row to include
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        rows = list(takewhile(
+            lambda values: values[1] >= since,
+            (values for values in self.engine.iter_table(self.table_name, reverse=True) if len(values) >= 2)
+        ))
+        for values in reversed(rows):
+            yield _make_row(values, columns)
+
+    def get_recent_rows(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the most recently saved session rows, newest first.
+
+        Args:
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of sessions, newest first
+        """
+        rows = islice(self.engine.iter_table(self.table_name, reverse=True), max(limit, 0))
+        return [_make_row(values).to_dict() for values in rows]
+
+    def get_latest_session(self) -> Optional[Dict[str, Any]]:
+        """Get the latest session from the shared log."""
+        sessions = self.get_recent_rows(limit=1)
+        return sessions[0] if sessions else None
+
+    def _latest_values(self, session_id: str) -> Optional[List[str]]:
+        """Return the newest row saved for a session."""
+        return next(self.engine.iter_table(self.table_name, session_id, reverse=True), None)
+
+    def _sessions(self) -> "SharedLogAgentStorage":
+        """Return the companion table that stores agno sessions."""
+        with self._lock:
+            if self._session_table is None:
+                self._session_table = SharedLogAgentStorage(f"{self.table_name}.sessions", self.log_dir)
+            return self._session_table
+
+    def drop(self) -> None:
+        """Drop this table and its agno sessions from the shared log."""
+        with self._lock:
+            self.engine.drop_table(self.table_name)
+            self.engine.drop_table(f"{self.table_name}.sessions")
+            self._session_owners = None
+
+    def flush(self) -> None:
+        """No-op kept for interface compatibility; every append reaches the OS immediately."""
+
+    def close(self) -> None:
+        """No-op: the shared engine stays open for the other tables."""
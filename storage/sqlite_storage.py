@@ -0,0 +1,288 @@
+"""
+SQLite-based storage for agent sessions.
+"""
+import os
+import json
+import uuid
+import sqlite3
+import datetime
+import threading
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Union
+
+from storage.rows import SessionRow, normalize_columns
+from storage.session_protocol import AgnoSessionProtocol
+
+class SQLiteAgentStorage(AgnoSessionProtocol):
+    """
+    Storage for agent sessions backed by a local SQLite database.
+    Drop-in replacement for CSVAgentStorage.
+
+    The database runs in WAL mode so readers never block the writer, and
+    every thread gets its own connection. Statements are built once per
+    storage and reused, so SQLite's per-connection statement cache keeps
+    them prepared.
+
+    The class also implements the agno storage protocol used by
+    ``agno.agent.Agent`` (see AgnoSessionProtocol). Agent sessions live in a
+    companion ``<table>.sessions`` table in the same database.
+    """
+    def __init__(self, table_name: str, db_dir: str = "storage/sqlite", db_name: str = "agents.db"):
+        """
+        Initialize the SQLite storage.
+
+        Args:
+            table_name: Name of the table to store sessions in
+            db_dir: Directory to store the database file
+            db_name: Database file name (shared by all tables in db_dir)
+        """
+        self.table_name = table_name
+        self.db_dir = db_dir
+        self.db_name = db_name
+        self.db_path = os.path.join(db_dir, db_name)
+        self.mode = "agent"
+        self._lock = threading.RLock()
+        self._session_table: Optional["SQLiteAgentStorage"] = None
+        self._session_owners: Optional[Dict[str, Dict[str, Any]]] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        # Create directory if it doesn't exist
+        os.makedirs(db_dir, exist_ok=True)
+
+        table = '"' + table_name.replace('"', '""') + '"'
+        self._table = table
+        self._index_prefix = '"' + f"idx_{table_name}".replace('"', '""')
+        self._insert_sql = (
+            f"INSERT INTO {table} (session_id, timestamp, input, response, metadata) "
+            f"VALUES (?, ?, ?, ?, ?)"
+        )
+        self._select_sql = f"SELECT session_id, timestamp, input, response, metadata FROM {table}"
+        self._by_session_sql = f"{self._select_sql} WHERE session_id = ? ORDER BY id LIMIT ?"
+        self._oldest_sql = f"{self._select_sql} ORDER BY id LIMIT ?"
+        self._newest_sql = f"{self._select_sql} ORDER BY id DESC LIMIT ?"
+        self._latest_sql = f"{self._select_sql} WHERE session_id = ? ORDER BY id DESC LIMIT 1"
+
+        self._create_table()
+
+    def _create_table(self) -> None:
+        """Create the sessions table and its indexes if they do not exist."""
+        with self._connection() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                f"id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                f"session_id TEXT NOT NULL, "
+                f"timestamp TEXT NOT NULL, "
+                f"input TEXT, "
+                f"response TEXT, "
+                f"metadata TEXT)"
+            )
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {self._index_prefix}_session_id" ON {self._table} (session_id, id)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self._index_prefix}_timestamp" ON {self._table} (timestamp)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection owned by the current thread, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _row_to_session(row: tuple) -> Dict[str, Any]:
+        """Convert a database row into a session dictionary."""
+        session_id, timestamp, input_text, response, metadata_json = row
+
+        # Parse metadata from JSON string
+        try:
+            metadata = json.loads(metadata_json or '{}')
+        except json.JSONDecodeError:
+            metadata = {}
+
+        return {
+            'session_id': session_id,
+            'timestamp': timestamp,
+            'input': input_text,
+            'response': response,
+            'metadata': metadata
+        }
+
+    def iter_sessions(self, session_id: Optional[str] = None,
+                      since: Union[str, datetime.datetime, None] = None,
+                      until: Union[str, datetime.datetime, None] = None,
+                      columns: Optional[Iterable[str]] = None,
+                      batch_size: int = 500) -> Iterator[SessionRow]:
+        """
+        Stream sessions from the SQLite storage in the order they were saved.
+
+        Only the requested columns are selected, rows are fetched in batches
+        and metadata is only decoded when a row's ``metadata`` is accessed.
+
+        Args:
+            session_id: Optional session ID to filter by
+            since: Only include sessions saved at or after this time
+            until: Only include sessions saved before this time
+            columns: Optional subset of columns to include in each row
+            batch_size: Number of rows fetched from the database at a time
+
+        Yields:
+            Lazy session rows
+        """
+        columns = normalize_columns(columns)
+        if isinstance(since, datetime.datetime):
+            since = since.isoformat()
+        if isinstance(until, datetime.datetime):
+            until = until.isoformat()
+
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+
+        sql = f"SELECT {', '.join(columns)} FROM {self._table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id"
+
+        cursor = self._connection().execute(sql, params)
+        try:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield SessionRow(dict(zip(columns, row)))
+        finally:
+            cursor.close()
+
+    def save_session(self, session_id: Optional[str] = None,
+                     input_text: str = "",
+                     response: str = "",
+                     metadata: Dict[str, Any] = None) -> str:
+        """
+        Save a session to the SQLite storage.
+
+        Args:
+            session_id: Optional session ID (will be generated if not provided)
+            input_text: Input text for the session
+            response: Response text for the session
+            metadata: Additional metadata for the session
+
+        Returns:
+            The session ID
+        """
+        if session_id is None:
+            session_id = str(uuid.uuid4())
+
+        self._append(session_id, input_text, response, json.dumps(metadata or {}))
+        return session_id
+
+    def _append(self, session_id: str, input_text: str, response: str, metadata_json: str) -> None:
+        """Insert one row with the current timestamp."""
+        timestamp = datetime.datetime.now().isoformat()
+        with self._connection() as conn:
+            conn.execute(self._insert_sql, (session_id, timestamp, input_text, response, metadata_json))
+
+    def get_sessions(self, session_id: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get sessions from the SQLite storage.
+
+        Args:
+            session_id: Optional session ID to filter by
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of sessions
+        """
+        conn = self._connection()
+        if session_id is not None:
+            rows = conn.execute(self._by_session_sql, (session_id, limit)).fetchall()
+        else:
+            rows = conn.execute(self._oldest_sql, (limit,)).fetchall()
+        return [self._row_to_session(row) for row in rows]
+
+    def _iter_since(self, since: str, columns: Optional[Iterable[str]] = None) -> Iterator[SessionRow]:
+        """
+        Stream the sessions saved at or after a time, oldest first, using the timestamp index.
+
+        Args:
+            since: ISO timestamp of the oldest row to include
+            columns: Optional subset of columns to include in each row
+
+        Yields:
+            Lazy session rows
+        """
+        return self.iter_sessions(since=since, columns=columns)
+
+    def get_recent_rows(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the most recently saved session rows, newest first.
+
+        Args:
+            limit: Maximum number of sessions to return
+
+        Returns:
+            List of sessions, newest first
+        """
+        rows = self._connection().execute(self._newest_sql, (limit,)).fetchall()
+        return [self._row_to_session(row) for row in rows]
+
+    def get_latest_session(self) -> Optional[Dict[str, Any]]:
+        """Get the latest session from the SQLite storage."""
+        sessions = self.get_recent_rows(limit=1)
+        return sessions[0] if sessions else None
+
+    def _latest_values(self, session_id: str) -> Optional[List[str]]:
+        """Return the newest row saved for a session, with one indexed lookup."""
+        row = self._connection().execute(self._latest_sql, (session_id,)).fetchone()
+        return list(row) if row is not None else None
+
+    def _sessions(self) -> "SQLiteAgentStorage":
+        """Return the companion table that stores agno sessions, opening it on first use."""
+        with self._lock:
+            if self._session_table is None:
+                self._session_table = SQLiteAgentStorage(f"{self.table_name}.sessions", self.db_dir, self.db_name)
+            return self._session_table
+
+    def drop(self) -> None:
+        """Delete every row of this table and its agno sessions."""
+        sessions_table = '"' + f"{self.table_name}.sessions".replace('"', '""') + '"'
+        with self._lock:
+            if self._session_table is not None:
+                self._session_table.close()
+                self._session_table = None
+            self._session_owners = None
+
+            with self._connection() as conn:
+                conn.execute(f"DROP TABLE IF EXISTS {sessions_table}")
+                conn.execute(f"DROP TABLE IF EXISTS {self._table}")
+            self._create_table()
+
+    def flush(self) -> None:
+        """No-op kept for interface compatibility; every save is committed."""
+
+    def close(self) -> None:
+        """Close all connections opened by this storage."""
+        with self._lock:
+            session_table, self._session_table = self._session_table, None
+        if session_table is not None:
+            session_table.close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
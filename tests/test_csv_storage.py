@@ -0,0 +1,144 @@
+"""
+Tests for the CSV session storage.
+"""
+import os
+import time
+
+import pytest
+
+from storage.csv_storage import CSVAgentStorage, _encode_row, _iter_records, _iter_records_reverse
+
+TRICKY_TEXTS = [
+    "plain",
+    "windows\r\nline break",
+    'quoted "word", then a comma',
+    '"\n"',
+    "trailing newline\n",
+    '""\r\n""',
+]
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    return str(tmp_path / "csv")
+
+
+def _save_many(storage: CSVAgentStorage, count: int, prefix: str = "s") -> list:
+    return [storage.save_session(f"{prefix}{i % 5}", input_text=f"input {i}", response=f"response {i}")
+            for i in range(count)]
+
+
+def _inputs(storage: CSVAgentStorage, session_id: str) -> list:
+    return [row["input"] for row in storage.get_sessions(session_id=session_id, limit=100)]
+
+
+def test_lookup_by_session_id_uses_index(csv_dir):
+    storage = CSVAgentStorage("agent", csv_dir)
+    _save_many(storage, 20)
+
+    assert _inputs(storage, "s3") == [f"input {i}" for i in range(3, 20, 5)]
+    assert storage.get_sessions(session_id="missing") == []
+    assert os.path.exists(storage.index_path)
+
+
+def test_index_picks_up_rows_written_before_a_crash(csv_dir):
+    storage = CSVAgentStorage("agent", csv_dir)
+    _save_many(storage, 10)
+
+    # Rows that reached the CSV file while the sidecar index was never updated
+    with open(storage.csv_path, 'ab') as f:
+        f.write(_encode_row(["s1", "2100-01-01T00:00:00", "late", "", "{}"]))
+
+    reopened = CSVAgentStorage("agent", csv_dir)
+    assert _inputs(reopened, "s1") == ["input 1", "input 6", "late"]
+
+
+@pytest.mark.parametrize("keep", [0, 1, 3, 4, -1])
+def test_index_rebuilds_after_torn_index_write(csv_dir, keep):
+    storage = CSVAgentStorage("agent", csv_dir)
+    _save_many(storage, 10)
+    expected = {f"s{i}": _inputs(storage, f"s{i}") for i in range(5)}
+
+    # Keep only the first bytes of the last index entry, as a crash mid-write would
+    with open(storage.index_path, 'rb') as f:
+        data = f.read()
+    head, last = data.rstrip(b"\r\n").rsplit(b"\n", 1)
+    with open(storage.index_path, 'wb') as f:
+        f.write(head + b"\n" + last[:keep])
+
+    reopened = CSVAgentStorage("agent", csv_dir)
+    assert {f"s{i}": _inputs(reopened, f"s{i}") for i in range(5)} == expected
+
+    reopened.save_session("s2", input_text="after")
+    assert _inputs(CSVAgentStorage("agent", csv_dir), "s2") == expected["s2"] + ["after"]
+
+
+def test_index_rebuilds_when_offsets_are_stale(csv_dir):
+    storage = CSVAgentStorage("agent", csv_dir)
+    _save_many(storage, 10)
+
+    # An index left behind by a table that was since rewritten
+    with open(storage.index_path, 'w') as f:
+        f.write("s0,3\ns1,17\n")
+
+    reopened = CSVAgentStorage("agent", csv_dir)
+    assert _inputs(reopened, "s0") == ["input 0", "input 5"]
+    assert _inputs(reopened, "s1") == ["input 1", "input 6"]
+
+
+def test_storages_on_the_same_table_see_each_others_rows(csv_dir):
+    first = CSVAgentStorage("agent", csv_dir)
+    second = CSVAgentStorage("agent", csv_dir)
+
+    first.save_session("a", input_text="one")
+    second.save_session("a", input_text="two")
+    first.save_session("b", input_text="three")
+
+    assert _inputs(first, "a") == ["one", "two"]
+    assert _inputs(second, "b") == ["three"]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 7, 64 * 1024])
+def test_reverse_scan_matches_forward_scan(tmp_path, block_size):
+    path = tmp_path / "rows.csv"
+    rows = [_encode_row([f"s{i}", f"t{i}", text, text[::-1], "{}"]) for i, text in enumerate(TRICKY_TEXTS * 3)]
+    path.write_bytes(b"".join(rows))
+
+    with open(path, 'rb') as f:
+        forward = list(_iter_records(f))
+        backward = list(_iter_records_reverse(f, block_size=block_size))
+
+    assert len(forward) == len(rows)
+    assert backward == forward[::-1]
+
+
+def test_recent_rows_keep_quoted_line_breaks(csv_dir):
+    storage = CSVAgentStorage("agent", csv_dir)
+    for i, text in enumerate(TRICKY_TEXTS):
+        storage.save_session(f"s{i}", input_text=text, response=text + "!", metadata={"text": text})
+
+    recent = storage.get_recent_rows(limit=4)
+
+    assert [row["input"] for row in recent] == TRICKY_TEXTS[::-1][:4]
+    assert [row["metadata"]["text"] for row in recent] == TRICKY_TEXTS[::-1][:4]
+    assert storage.get_latest_session()["response"] == TRICKY_TEXTS[-1] + "!"
+    assert len(storage.get_recent_rows(limit=100)) == len(TRICKY_TEXTS)
+    assert storage.get_recent_rows(limit=0) == []
+
+
+def test_shards_are_merged_by_timestamp(csv_dir, monkeypatch):
+    shards = []
+    for pid in (101, 102, 103):
+        monkeypatch.setattr(os, "getpid", lambda pid=pid: pid)
+        shards.append(CSVAgentStorage("agent", csv_dir, sharded=True))
+
+    for i in range(30):
+        shards[(i * 7) % 3].save_session(f"s{i % 4}", input_text=str(i))
+        time.sleep(0.001)
+
+    assert len({shard.csv_path for shard in shards}) == 3
+    for shard in shards:
+        rows = list(shard.iter_sessions())
+        assert [row["input"] for row in rows] == [str(i) for i in range(30)]
+        assert [row["input"] for row in shard.iter_sessions(session_id="s1")] == [str(i) for i in range(1, 30, 4)]
+        assert [row["input"] for row in shard.get_recent_rows(limit=5)] == [str(i) for i in range(29, 24, -1)]
@@ -0,0 +1,104 @@
+"""
+Tests for the batched, concurrent embedding pipeline.
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from knowledge.embedding_pipeline import EmbeddingPipeline, estimate_tokens, token_batches
+from knowledge.fake_embedder import FakeEmbedder
+
+
+def _texts(count: int) -> list:
+    return [f"chunk {i} " + "word " * (i % 40) for i in range(count)]
+
+
+def _collect(pipeline: EmbeddingPipeline, texts: list) -> np.ndarray:
+    """Run the pipeline and put the embeddings back in text order."""
+    vectors = [None] * len(texts)
+    for indices, batch in pipeline.run(texts):
+        for i, vector in zip(indices, batch):
+            vectors[i] = vector
+    return np.stack(vectors)
+
+
+def test_token_batches_respect_bounds():
+    texts = _texts(200) + ["long " * 500]
+    batches = list(token_batches(texts, max_tokens=100, max_size=8))
+
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or sum(estimate_tokens(texts[i]) for i in batch) <= 100
+    assert batches[-1] == [len(texts) - 1]
+
+
+def test_pipeline_embeds_every_text_within_batch_bounds():
+    embedder = FakeEmbedder(dimensions=32)
+    sizes = []
+
+    def embed(texts):
+        sizes.append(sum(estimate_tokens(text) for text in texts))
+        return embedder.embed_documents(texts)
+
+    texts = _texts(300)
+    pipeline = EmbeddingPipeline(embed, max_batch_tokens=200, max_batch_size=16, max_workers=4)
+    vectors = _collect(pipeline, texts)
+
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, [embedder.embed_query(text) for text in texts], rtol=1e-6)
+    assert len(sizes) == len(list(token_batches(texts, 200, 16)))
+    assert max(sizes) <= 200
+
+
+def test_pipeline_retries_only_failed_batches():
+    embedder = FakeEmbedder(dimensions=16, failure_rate=0.3, latency=0.001, seed=1)
+    texts = _texts(400)
+    pipeline = EmbeddingPipeline(embedder.embed_documents, max_batch_tokens=100, max_workers=4,
+                                 max_retries=20, retry_delay=0)
+    vectors = _collect(pipeline, texts)
+
+    assert len(vectors) == len(texts)
+    assert embedder.calls > len(list(token_batches(texts, 100, 256)))
+    # Each text was embedded by exactly one successful request
+    assert embedder.texts_embedded == len(texts)
+
+
+def test_pipeline_raises_once_retries_are_exhausted():
+    embedder = FakeEmbedder(failure_rate=1.0)
+    pipeline = EmbeddingPipeline(embedder.embed_documents, max_batch_tokens=50, max_workers=1,
+                                 max_in_flight=1, max_retries=2, retry_delay=0)
+
+    with pytest.raises(RuntimeError, match="Simulated embedding failure"):
+        _collect(pipeline, _texts(100))
+    assert embedder.calls == 3
+
+
+def test_pipeline_rejects_wrong_number_of_embeddings():
+    pipeline = EmbeddingPipeline(lambda texts: [[0.0]], max_retries=0)
+
+    with pytest.raises(ValueError, match="Expected 2 embeddings"):
+        _collect(pipeline, ["a", "b"])
+
+
+def test_pipeline_bounds_concurrent_requests():
+    embedder = FakeEmbedder(dimensions=8, latency=0.005)
+    lock = threading.Lock()
+    active, peak = 0, 0
+
+    def embed(texts):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            return embedder.embed_documents(texts)
+        finally:
+            with lock:
+                active -= 1
+
+    pipeline = EmbeddingPipeline(embed, max_batch_size=4, max_workers=3)
+    _collect(pipeline, _texts(120))
+
+    assert 1 <= peak <= 3
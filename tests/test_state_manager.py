@@ -0,0 +1,131 @@
+"""
+Tests for the workflow state manager.
+"""
+import os
+
+import pytest
+
+from workflow.state_manager import WorkflowState
+
+
+@pytest.fixture
+def state_file(tmp_path):
+    return str(tmp_path / "state" / "workflow_state.json")
+
+
+def _journal_records(state: WorkflowState) -> int:
+    with open(state.journal_file) as f:
+        return sum(1 for _ in f)
+
+
+def _contents(paths) -> dict:
+    contents = {}
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+    return contents
+
+
+def _fill(state: WorkflowState, count: int) -> None:
+    for i in range(count):
+        state.update(f"requirements.r{i}", {"text": f"requirement {i}"})
+        state.add_to_history("requirements", {"step": i})
+    state.set_stage("design")
+
+
+@pytest.mark.parametrize("snapshot_every", [3, 100])
+def test_journaled_state_reloads(state_file, snapshot_every):
+    state = WorkflowState(state_file, journaled=True, snapshot_every=snapshot_every)
+    _fill(state, 10)
+    expected = state.get_full_state()
+    state.close()
+
+    assert os.path.exists(state.snapshot_file) == (snapshot_every < 21)
+    assert _journal_records(state) == 21 % snapshot_every
+
+    reloaded = WorkflowState(state_file, journaled=True, snapshot_every=snapshot_every)
+    assert reloaded.get_full_state() == expected
+    assert reloaded.get_current_stage() == "design"
+    assert [entry["data"]["step"] for entry in reloaded.history_for("requirements")] == list(range(10))
+
+
+def test_journal_replay_skips_records_covered_by_the_snapshot(state_file):
+    state = WorkflowState(state_file, journaled=True, snapshot_every=1000)
+    _fill(state, 3)
+    with open(state.journal_file) as f:
+        older = f.read()
+    state.snapshot()
+    state.update("code.main", "print('hi')")
+    state.close()
+
+    # A crash between writing the snapshot and truncating the journal leaves old records behind
+    with open(state.journal_file) as f:
+        newer = f.read()
+    with open(state.journal_file, 'w') as f:
+        f.write(older + newer)
+
+    reloaded = WorkflowState(state_file, journaled=True)
+    assert reloaded.get("code.main") == "print('hi')"
+    assert len(reloaded.get("history")) == 3
+    assert len(reloaded.get("requirements")) == 3
+
+
+def test_torn_journal_record_is_dropped(state_file):
+    state = WorkflowState(state_file, journaled=True)
+    _fill(state, 2)
+    expected = state.get_full_state()
+    state.close()
+
+    with open(state.journal_file, 'a') as f:
+        f.write('{"seq":99,"ops":[["set","current_stage","te')
+
+    reloaded = WorkflowState(state_file, journaled=True)
+    assert reloaded.get_full_state() == expected
+
+    reloaded.set_stage("testing")
+    reloaded.close()
+    assert WorkflowState(state_file, journaled=True).get_current_stage() == "testing"
+
+
+@pytest.mark.parametrize("options", [{}, {"journaled": True}, {"thread_safe": True}])
+def test_transaction_rolls_back_on_error(state_file, options):
+    state = WorkflowState(state_file, **options)
+    _fill(state, 2)
+    state.history_for("requirements")
+    expected = state.get_full_state()
+    state.close()
+    on_disk = _contents([state_file, state.journal_file, state.snapshot_file])
+
+    with pytest.raises(RuntimeError):
+        with state.transaction():
+            state.update("requirements.r0", {"text": "changed"})
+            state.update("code.main", "print('hi')")
+            state.add_to_history("design", {"step": 0})
+            state.set_stage("testing")
+            raise RuntimeError("abort")
+
+    assert state.get_full_state() == expected
+    assert state.history_for("design") == []
+    assert _contents(on_disk) == on_disk
+    assert WorkflowState(state_file, **options).get_full_state() == expected
+
+
+def test_transaction_writes_once_on_commit(state_file):
+    state = WorkflowState(state_file, journaled=True)
+    state.set_stage("design")
+    records = _journal_records(state)
+
+    with state.transaction():
+        state.update("code.main", "print('hi')")
+        with state.transaction():
+            state.add_to_history("code", {"file": "main.py"})
+        assert _journal_records(state) == records
+        state.set_stage("testing")
+
+    assert _journal_records(state) == records + 1
+    state.close()
+
+    reloaded = WorkflowState(state_file, journaled=True)
+    assert reloaded.get_current_stage() == "testing"
+    assert reloaded.last("code")["data"] == {"file": "main.py"}
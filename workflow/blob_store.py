@@ -0,0 +1,80 @@
+"""
+Content-addressed storage for large workflow artifacts.
+"""
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+# Key marking a dictionary as a reference to a stored blob
+BLOB_REF_KEY = "$blob"
+
+
+def is_blob_ref(value: Any) -> bool:
+    """Check whether a state value is a reference to a stored blob."""
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF_KEY in value
+
+
+class BlobStore:
+    """
+    Stores JSON values once per distinct content, keyed by their SHA-256.
+
+    Values are serialized canonically (sorted keys, no whitespace), so equal
+    values always map to the same blob. Blobs are spread over two-character
+    subdirectories and written atomically, and are never modified once
+    written.
+    """
+    def __init__(self, blob_dir: str):
+        """
+        Initialize the blob store.
+
+        Args:
+            blob_dir: Directory to store blobs in
+        """
+        self.blob_dir = blob_dir
+
+    @staticmethod
+    def encode(value: Any) -> bytes:
+        """Serialize a value canonically."""
+        return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest + ".json")
+
+    def put(self, value: Any, data: Optional[bytes] = None) -> Dict[str, str]:
+        """
+        Store a value unless an identical one is already stored.
+
+        Args:
+            value: JSON-serializable value
+            data: The value's canonical encoding, if already computed
+
+        Returns:
+            Reference to the blob, to be stored in place of the value
+        """
+        if data is None:
+            data = self.encode(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        return {BLOB_REF_KEY: digest}
+
+    def get(self, ref: Dict[str, str]) -> Any:
+        """
+        Load the value a reference points to.
+
+        Args:
+            ref: Blob reference returned by put()
+
+        Returns:
+            The stored value
+        """
+        with open(self._path(ref[BLOB_REF_KEY]), 'rb') as f:
+            return json.loads(f.read())
@@ -0,0 +1,115 @@
+"""
+Append-only on-disk log of workflow history entries spilled from memory.
+"""
+import os
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class HistoryLog:
+    """
+    Holds history entries that no longer fit in the in-memory window.
+
+    Each line is ``<index>\\t<entry JSON>``, where the index is the entry's
+    position in the full history. An entry may be written more than once
+    if a spill was interrupted; the last copy of an index wins. Byte offsets
+    of the entries are indexed in memory on first read, so reading a page
+    of history seeks straight to it.
+    """
+    def __init__(self, path: str):
+        """
+        Initialize the history log.
+
+        Args:
+            path: Path of the log file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets: Optional[Dict[int, int]] = None
+        self._file = None
+
+    def _scan(self) -> Tuple[Dict[int, int], int]:
+        """Index the byte offset of every complete entry, returning the offsets and where they end."""
+        offsets = {}
+        offset = 0
+        if not os.path.exists(self.path):
+            return offsets, offset
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final line from an interrupted write
+                    break
+                index, _, _ = line.partition(b"\t")
+                offsets[int(index)] = offset
+                offset += len(line)
+        return offsets, offset
+
+    def append(self, start: int, entries: List[Any]) -> None:
+        """
+        Append entries to the log.
+
+        Args:
+            start: Index of the first entry in the full history
+            entries: Entries to append, in order
+        """
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, 'ab')
+                # Drop a torn final line so new entries start on a line of their own
+                self._offsets, end = self._scan()
+                self._file.truncate(end)
+
+            offset = self._file.seek(0, os.SEEK_END)
+            for index, entry in enumerate(entries, start):
+                line = f"{index}\t{json.dumps(entry, separators=(',', ':'))}\n".encode('utf-8')
+                self._file.write(line)
+                self._offsets[index] = offset
+                offset += len(line)
+            self._file.flush()
+
+    def read(self, start: int, stop: int) -> List[Any]:
+        """
+        Read entries by index.
+
+        Args:
+            start: Index of the first entry to read
+            stop: Index after the last entry to read
+
+        Returns:
+            The entries in the range that are in the log
+        """
+        return self.read_at(range(start, stop))
+
+    def read_at(self, indices: Iterable[int]) -> List[Any]:
+        """
+        Read the entries at the given indices.
+
+        Args:
+            indices: Indices of the entries to read, in the order to return them
+
+        Returns:
+            The entries that are in the log
+        """
+        with self._lock:
+            if self._offsets is None:
+                self._offsets, _ = self._scan()
+            offsets = [self._offsets[i] for i in indices if i in self._offsets]
+
+        entries = []
+        if not offsets:
+            return entries
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                _, _, data = f.readline().partition(b"\t")
+                entries.append(json.loads(data))
+        return entries
+
+    def close(self) -> None:
+        """Close the append handle."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,83 @@
+"""
+Append-only, memory-mapped storage for paged-out workflow state values.
+"""
+import os
+import json
+import mmap
+from typing import Any, Dict, List
+
+# Key marking a dictionary as a reference to a value in the page file
+PAGE_REF_KEY = "$page"
+
+
+def is_page_ref(value: Any) -> bool:
+    """Check whether a state value is a reference to a paged-out value."""
+    return isinstance(value, dict) and len(value) == 1 and PAGE_REF_KEY in value
+
+
+class PageFile:
+    """
+    Holds large state values as JSON byte ranges in a single file.
+
+    Values are only ever appended, and reads slice a read-only memory map
+    of the file, so a value is decoded only when it is accessed and the
+    operating system pages in just the bytes that are touched.
+    """
+    def __init__(self, path: str):
+        """
+        Open (or create) the page file.
+
+        Args:
+            path: Path of the page file
+        """
+        self.path = path
+        self._file = open(path, 'a+b')
+        self._map = None
+
+    def size(self) -> int:
+        """Return the size of the page file in bytes."""
+        return self._file.seek(0, os.SEEK_END)
+
+    def append(self, data: bytes) -> Dict[str, List[int]]:
+        """
+        Append an encoded value.
+
+        Args:
+            data: JSON encoding of the value
+
+        Returns:
+            Reference to the value, to be stored in place of it
+        """
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._file.flush()
+        return {PAGE_REF_KEY: [offset, len(data)]}
+
+    def read_bytes(self, ref: Dict[str, List[int]]) -> bytes:
+        """Return the encoded value a reference points to."""
+        offset, length = ref[PAGE_REF_KEY]
+        mapped = self._map
+        if mapped is None or offset + length > len(mapped):
+            # The file grew since it was mapped. The old map is left for the garbage
+            # collector to close, since another thread may still be reading from it
+            mapped = self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped[offset:offset + length]
+
+    def read(self, ref: Dict[str, List[int]]) -> Any:
+        """
+        Decode the value a reference points to.
+
+        Args:
+            ref: Page reference returned by append()
+
+        Returns:
+            The stored value
+        """
+        return json.loads(self.read_bytes(ref))
+
+    def close(self) -> None:
+        """Unmap and close the page file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
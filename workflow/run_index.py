@@ -0,0 +1,177 @@
+"""
+Index of workflow runs, each with its own state shard.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import datetime
+from typing import Dict, List, Any, Optional
+
+# Run IDs become directory names, so they are restricted to safe characters
+_RUN_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def new_run_id() -> str:
+    """Generate a run ID that sorts by creation time."""
+    return f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+class RunIndex:
+    """
+    Lightweight index of workflow runs.
+
+    Every run owns a directory ``<runs_dir>/<run_id>/`` holding its state
+    shard (``state.json`` plus any journal, snapshot, page or blob files)
+    and a small ``run.json`` record. Only the run's own process writes its
+    record, so concurrent runs never contend for a shared index file;
+    listing simply reads the records.
+    """
+    def __init__(self, runs_dir: str = "storage/runs"):
+        """
+        Initialize the run index.
+
+        Args:
+            runs_dir: Directory holding one subdirectory per run
+        """
+        self.runs_dir = runs_dir
+        os.makedirs(runs_dir, exist_ok=True)
+
+    def run_dir(self, run_id: str) -> str:
+        """Return the directory of a run."""
+        if not _RUN_ID.match(run_id) or run_id in (".", ".."):
+            raise ValueError(f"Invalid run ID: {run_id!r}")
+        return os.path.join(self.runs_dir, run_id)
+
+    def state_file(self, run_id: str) -> str:
+        """Return the path of a run's state shard."""
+        return os.path.join(self.run_dir(run_id), "state.json")
+
+    def _record_path(self, run_id: str) -> str:
+        return os.path.join(self.run_dir(run_id), "run.json")
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        path = self._record_path(record["run_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def create(self, run_id: Optional[str] = None, **fields) -> Dict[str, Any]:
+        """
+        Register a new run, or return the record of an existing one.
+
+        Args:
+            run_id: Optional run ID (generated if not provided)
+            **fields: Extra fields to store in the run record
+
+        Returns:
+            The run record
+        """
+        run_id = run_id or new_run_id()
+        existing = self.get(run_id)
+        if existing is not None:
+            return existing
+
+        os.makedirs(self.run_dir(run_id), exist_ok=True)
+        now = time.time()
+        record = {
+            "run_id": run_id,
+            "created_at": now,
+            "updated_at": now,
+            "stage": None,
+            "status": "running",
+            "pid": os.getpid(),
+        }
+        record.update(fields)
+        self._write(record)
+        return record
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a run.
+
+        Args:
+            run_id: Run ID
+
+        Returns:
+            The run record, or None if the run does not exist
+        """
+        try:
+            with open(self._record_path(run_id), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, run_id: str, **fields) -> Dict[str, Any]:
+        """
+        Update fields of a run record.
+
+        Args:
+            run_id: Run ID
+            **fields: Fields to set
+
+        Returns:
+            The updated run record
+        """
+        record = self.get(run_id) or self.create(run_id)
+        record.update(fields)
+        record["updated_at"] = time.time()
+        self._write(record)
+        return record
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List runs, oldest first.
+
+        Args:
+            status: Optional status to filter by, e.g. "running" or "complete"
+
+        Returns:
+            Run records
+        """
+        records = []
+        for name in os.listdir(self.runs_dir):
+            if not _RUN_ID.match(name):
+                continue
+            record = self.get(name)
+            if record is not None and (status is None or record.get("status") == status):
+                records.append(record)
+        return sorted(records, key=lambda record: (record["created_at"], record["run_id"]))
+
+    def delete(self, run_id: str) -> None:
+        """Delete a run and its state shard."""
+        shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+
+    def gc(self, older_than: Optional[float] = None,
+           keep_last: Optional[int] = None,
+           only_complete: bool = True) -> List[str]:
+        """
+        Delete old runs.
+
+        Args:
+            older_than: Delete runs not updated for this many seconds
+            keep_last: Keep at least this many of the newest runs
+            only_complete: Only delete runs that reached the "complete" status
+
+        Returns:
+            IDs of the deleted runs
+        """
+        runs = self.list()
+        if keep_last is not None:
+            runs = runs[:max(len(runs) - keep_last, 0)]
+
+        cutoff = time.time() - older_than if older_than is not None else None
+        deleted = []
+        for record in runs:
+            if only_complete and record.get("status") != "complete":
+                continue
+            if cutoff is not None and record["updated_at"] >= cutoff:
+                continue
+            if cutoff is None and keep_last is None:
+                continue
+            self.delete(record["run_id"])
+            deleted.append(record["run_id"])
+        return deleted
@@ -39,7 +39,15 @@ class SDLCWorkflow:
     def __init__(self,
                  state_file: Optional[str] = "storage/workflow_state.json",
                  storage_dir: str = "storage/csv",
-                 knowledge_dir: str = "knowledge/resources"):
+                 knowledge_dir: str = "knowledge/resources",
+                 journaled_state: bool = False,
+                 blob_threshold: Optional[int] = None,
+                 paged_state: bool = False,
+                 run_id: Optional[str] = None,
+                 runs_dir: Optional[str] = None,
+                 state_codec: str = "json",
+                 history_window: Optional[int] = None,
+                 knowledge_index_type: str = "auto"):
         """
         Initialize the SDLC workflow.
 
@@ -47,14 +55,33 @@ class SDLCWorkflow:
             state_file: Path to save workflow state
             storage_dir: Directory for CSV storage
             knowledge_dir: Directory for knowledge resources
+            journaled_state: Persist state changes as journal deltas plus periodic snapshots
+            blob_threshold: Store state artifacts of at least this many bytes once, by content hash
+            paged_state: Page large state artifacts out to a memory-mapped file, loaded on access
+            run_id: ID of a run to resume in its own state shard (instead of state_file)
+            runs_dir: Directory of per-run state shards; setting it starts a new run if run_id is not given
+            state_codec: Codec for the state file, "json" (readable) or "msgpack" (compact binary)
+            history_window: Number of recent history entries to keep in memory; older ones spill to disk
+            knowledge_index_type: Knowledge base index, "flat", "ivf_flat", "ivf_pq", "hnsw" or "auto"
         """
-        # Initialize workflow state
-        self.state_manager = WorkflowState(state_file)
+        # Initialize workflow state, in a per-run shard when a run is requested
+        state_options = {
+            "journaled": journaled_state,
+            "blob_threshold": blob_threshold,
+            "paged": paged_state,
+            "codec": state_codec,
+            "history_window": history_window,
+        }
+        if run_id is not None or runs_dir is not None:
+            self.state_manager = WorkflowState.for_run(run_id, runs_dir or "storage/runs", **state_options)
+        else:
+            self.state_manager = WorkflowState(state_file, **state_options)
+        self.run_id = self.state_manager.run_id
 
         # Initialize knowledge base if resources exist
         self.knowledge_base = None
         if os.path.exists(knowledge_dir) and any(os.listdir(knowledge_dir)):
-            self.knowledge_base = FAISSKnowledgeBase(docs_path=knowledge_dir)
+            self.knowledge_base = FAISSKnowledgeBase(docs_path=knowledge_dir, index_type=knowledge_index_type)
 
             # Get all PDF files in the knowledge directory
             pdf_files = [
@@ -64,14 +91,8 @@ class SDLCWorkflow:
             ]
 
             if pdf_files:
-                self.knowledge_base.load_documents(pdf_files)
-
-                # Build index if it doesn't exist
-                index_path = os.path.join(knowledge_dir, "index.faiss")
-                if not os.path.exists(index_path):
-                    self.knowledge_base.build_index()
-                else:
-                    self.knowledge_base.load_index()
+                # Build the index, or re-embed only files added or changed since it was built
+                self.knowledge_base.update_index(pdf_files)
 
         # Initialize all agents
         self.agents = {
@@ -112,13 +133,14 @@ class SDLCWorkflow:
             # If not JSON, use the raw response
             requirements = {"raw": response}
 
-        # Update state
-        self.state_manager.update("requirements", requirements)
-        self.state_manager.add_to_history("requirements", {
-            "input": requirements_text,
-            "output": requirements
-        })
-        self.state_manager.set_stage("user_stories")
+        # Update state in one write
+        with self.state_manager.transaction():
+            self.state_manager.update("requirements", requirements)
+            self.state_manager.add_to_history("requirements", {
+                "input": requirements_text,
+                "output": requirements
+            })
+            self.state_manager.set_stage("user_stories")
 
         return requirements
 
@@ -138,13 +160,14 @@ class SDLCWorkflow:
             # If not JSON, use the raw response
             user_stories = [{"raw": response}]
 
-        # Update state
-        self.state_manager.update("user_stories", user_stories)
-        self.state_manager.add_to_history("user_stories", {
-            "input": requirements,
-            "output": user_stories
-        })
-        self.state_manager.set_stage("product_review")
+        # Update state in one write
+        with self.state_manager.transaction():
+            self.state_manager.update("user_stories", user_stories)
+            self.state_manager.add_to_history("user_stories", {
+                "input": requirements,
+                "output": user_stories
+            })
+            self.state_manager.set_stage("product_review")
 
         return user_stories
 
@@ -157,20 +180,21 @@ class SDLCWorkflow:
             f"Review these user stories: {json.dumps(user_stories)}"
         )
 
-        # Update state
-        self.state_manager.update("feedback.product_review", response)
-        self.state_manager.add_to_history("product_review", {
-            "input": user_stories,
-            "output": response
-        })
-
-        # Determine next stage based on response
-        if response.startswith("APPROVED"):
-            self.state_manager.update("review_status.product_review", "approved")
-            self.state_manager.set_stage("create_design_documents")
-        else:
-            self.state_manager.update("review_status.product_review", "needs_revision")
-            self.state_manager.set_stage("revise_user_stories")
+        # Update state in one write
+        with self.state_manager.transaction():
+            self.state_manager.update("feedback.product_review", response)
+            self.state_manager.add_to_history("product_review", {
+                "input": user_stories,
+                "output": response
+            })
+
+            # Determine next stage based on response
+            if response.startswith("APPROVED"):
+                self.state_manager.update("review_status.product_review", "approved")
+                self.state_manager.set_stage("create_design_documents")
+            else:
+                self.state_manager.update("review_status.product_review", "needs_revision")
+                self.state_manager.set_stage("revise_user_stories")
 
         return {"response": response}
 
@@ -193,13 +217,14 @@ class SDLCWorkflow:
             # If not JSON, use the raw response
             revised_stories = [{"raw": response}]
 
-        # Update state
-        self.state_manager.update("user_stories", revised_stories)
-        self.state_manager.add_to_history("revise_user_stories", {
-            "input": {"stories": user_stories, "feedback": feedback},
-            "output": revised_stories
-        })
-        self.state_manager.set_stage("product_review")
+        # Update state in one write
+        with self.state_manager.transaction():
+            self.state_manager.update("user_stories", revised_stories)
+            self.state_manager.add_to_history("revise_user_stories", {
+                "input": {"stories": user_stories, "feedback": feedback},
+                "output": revised_stories
+            })
+            self.state_manager.set_stage("product_review")
 
         return revised_stories
 
@@ -225,13 +250,14 @@ class SDLCWorkflow:
                 "technical": {"raw": response}
             }
 
-        # Update state
-        self.state_manager.update("design_documents", design_docs)
-        self.state_manager.add_to_history("create_design_documents", {
-            "input": {"requirements": requirements, "user_stories": user_stories},
-            "output": design_docs
-        })
-        self.state_manager.set_stage("design_review")
+        # Update state in one write
+        with self.state_manager.transaction():
+            self.state_manager.update("design_documents", design_docs)
+            self.state_manager.add_to_history("create_design_documents", {
+                "input": {"requirements": requirements, "user_stories": user_stories},
+                "output": design_docs
+            })
+            self.state_manager.set_stage("design_review")
 
         return design_docs
 
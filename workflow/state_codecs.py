@@ -0,0 +1,252 @@
+"""
+Serialization codecs for persisted workflow state.
+
+JSON stays the default and human-readable format. The binary codec
+(MessagePack) prefixes its output with a magic header, so files are
+decoded with the right codec regardless of how they were written.
+
+Usage:
+    python -m workflow.state_codecs convert storage/workflow_state.json --to msgpack
+    python -m workflow.state_codecs benchmark storage/workflow_state.json
+"""
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+
+# Header written in front of binary-encoded state: magic, format version, codec ID
+MAGIC = b"WFST"
+FORMAT_VERSION = 1
+
+
+class JSONCodec:
+    """Plain JSON, indented for readability unless compact output is requested."""
+    name = "json"
+
+    def encode(self, value: Any, compact: bool = False) -> bytes:
+        """
+        Encode a value.
+
+        Args:
+            value: JSON-serializable value
+            compact: Leave out all optional whitespace
+
+        Returns:
+            Encoded bytes
+        """
+        if compact:
+            return json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return json.dumps(value, indent=2).encode('utf-8')
+
+    def decode(self, data: bytes) -> Any:
+        """Decode bytes produced by encode()."""
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    """Compact binary encoding using MessagePack."""
+    name = "msgpack"
+    codec_id = b"M"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError("The msgpack codec requires the msgpack package: pip install msgpack") from e
+        self._msgpack = msgpack
+
+    def encode(self, value: Any, compact: bool = False) -> bytes:
+        """
+        Encode a value.
+
+        Args:
+            value: JSON-serializable value
+            compact: Ignored; the binary encoding is always compact
+
+        Returns:
+            Encoded bytes, starting with the binary header
+        """
+        header = MAGIC + bytes([FORMAT_VERSION]) + self.codec_id
+        return header + self._msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        """Decode bytes produced by encode()."""
+        return self._msgpack.unpackb(data[len(MAGIC) + 2:], raw=False, strict_map_key=False)
+
+
+_CODECS = {
+    JSONCodec.name: JSONCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+# Binary codecs by the ID stored in their header
+_BINARY_CODECS = {
+    MsgpackCodec.codec_id: MsgpackCodec.name,
+}
+
+
+def get_codec(name: str) -> Any:
+    """
+    Return a codec by name.
+
+    Args:
+        name: Codec name ("json" or "msgpack")
+
+    Returns:
+        The codec
+    """
+    if name not in _CODECS:
+        raise ValueError(f"Unknown state codec: {name}")
+    return _CODECS[name]()
+
+
+def detect_codec(data: bytes) -> Any:
+    """
+    Return the codec that produced the given bytes.
+
+    Args:
+        data: Encoded state
+
+    Returns:
+        The binary codec named in the header, or the JSON codec
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        return JSONCodec()
+    version, codec_id = data[len(MAGIC)], data[len(MAGIC) + 1:len(MAGIC) + 2]
+    if version != FORMAT_VERSION or codec_id not in _BINARY_CODECS:
+        raise ValueError(f"Unsupported state format (version {version}, codec {codec_id!r})")
+    return get_codec(_BINARY_CODECS[codec_id])
+
+
+def decode(data: bytes) -> Any:
+    """Decode state written by any codec."""
+    return detect_codec(data).decode(data)
+
+
+def read_file(path: str) -> Any:
+    """
+    Read a state file written by any codec.
+
+    Args:
+        path: File to read
+
+    Returns:
+        The decoded value
+    """
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+
+def write_file(path: str, value: Any, codec: Any, compact: bool = False) -> None:
+    """
+    Atomically replace a file with an encoded value.
+
+    Args:
+        path: File to write
+        value: Value to encode
+        codec: Codec to encode with
+        compact: Request the codec's most compact output
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(codec.encode(value, compact=compact))
+    os.replace(tmp_path, path)
+
+
+def convert(path: str, to: str, output: Optional[str] = None) -> str:
+    """
+    Re-encode a state file or snapshot with another codec.
+
+    Args:
+        path: File to convert
+        to: Name of the codec to convert to
+        output: Optional output path (the file is converted in place by default)
+
+    Returns:
+        Path of the converted file
+    """
+    output = output or path
+    write_file(output, read_file(path), get_codec(to))
+    return output
+
+
+def _sample_state(stages: int = 50) -> Dict[str, Any]:
+    """Build a synthetic state resembling a long run, for benchmarking."""
+    code = {f"module_{i}.py": "def handler(event):\n    return {'status': 200}\n" * 40 for i in range(20)}
+    stories = [{"id": i, "title": f"Story {i}", "criteria": ["given", "when", "then"]} for i in range(30)]
+    return {
+        "current_stage": "code_review",
+        "requirements": {"raw": "The system shall " * 200},
+        "user_stories": stories,
+        "design_documents": {"functional": {"raw": "Design " * 500}, "technical": {"raw": "Tech " * 500}},
+        "code": code,
+        "history": [
+            {"stage": f"stage_{i}", "data": {"input": stories, "output": {"score": i / 3, "ok": True}}}
+            for i in range(stages)
+        ],
+    }
+
+
+def benchmark(value: Any, repeat: int = 20) -> List[Dict[str, Any]]:
+    """
+    Measure encode/decode time and encoded size of every available codec.
+
+    Args:
+        value: State to encode
+        repeat: Number of timed iterations per codec
+
+    Returns:
+        One result per codec, with sizes in bytes and times in milliseconds
+    """
+    variants = [("json (indented)", JSONCodec(), False), ("json (compact)", JSONCodec(), True)]
+    try:
+        variants.append(("msgpack", MsgpackCodec(), True))
+    except ImportError:
+        pass
+
+    results = []
+    for label, codec, compact in variants:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            data = codec.encode(value, compact=compact)
+        encode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode(data)
+        decode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        results.append({"codec": label, "bytes": len(data), "encode_ms": encode_ms, "decode_ms": decode_ms})
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Convert and benchmark workflow state codecs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="Re-encode a state file or snapshot")
+    convert_parser.add_argument("path", help="File to convert")
+    convert_parser.add_argument("--to", choices=sorted(_CODECS), required=True, help="Codec to convert to")
+    convert_parser.add_argument("--output", help="Output path (converts in place by default)")
+
+    benchmark_parser = commands.add_parser("benchmark", help="Compare codec speed and size")
+    benchmark_parser.add_argument("path", nargs="?", help="State file to benchmark with (synthetic state by default)")
+    benchmark_parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per codec")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        print(convert(args.path, args.to, args.output))
+    else:
+        value = read_file(args.path) if args.path else _sample_state()
+        print(f"{'codec':<18}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+        for result in benchmark(value, args.repeat):
+            print(f"{result['codec']:<18}{result['bytes']:>12}"
+                  f"{result['encode_ms']:>12.3f}{result['decode_ms']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
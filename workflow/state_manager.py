@@ -1,22 +1,231 @@
 """
 State management for the SDLC workflow.
 """
+import bisect
 import json
 import os
-from typing import Dict, List, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from workflow.blob_store import BlobStore, is_blob_ref
+from workflow.history_log import HistoryLog
+from workflow.page_file import PAGE_REF_KEY, PageFile, is_page_ref
+from workflow.run_index import RunIndex
+from workflow.state_codecs import get_codec, read_file, write_file
+
+# Key of the page file name in a paged state file or snapshot
+PAGES_KEY = "$pages"
+
+# Top-level keys that are never paged out
+UNPAGED_KEYS = ("current_stage", "history")
+
+
+def _is_ref(value: Any, blobs: Optional[BlobStore], pages: Optional[PageFile]) -> bool:
+    """Check whether a value is a blob or page reference that can be resolved."""
+    return ((blobs is not None and is_blob_ref(value)) or
+            (pages is not None and is_page_ref(value)))
+
+
+def _deref(value: Any, blobs: Optional[BlobStore], pages: Optional[PageFile]) -> Any:
+    """Load the value a blob or page reference points to."""
+    if is_page_ref(value):
+        return pages.read(value)
+    return blobs.get(value)
+
+
+def _resolve(value: Any, blobs: Optional[BlobStore], pages: Optional[PageFile]) -> Any:
+    """
+    Replace every reference inside a value with the value it points to.
+
+    Containers without references are returned unchanged rather than copied.
+    """
+    if _is_ref(value, blobs, pages):
+        return _resolve(_deref(value, blobs, pages), blobs, pages)
+    if isinstance(value, dict):
+        resolved = {k: _resolve(v, blobs, pages) for k, v in value.items()}
+        return value if all(resolved[k] is value[k] for k in value) else resolved
+    if isinstance(value, list):
+        resolved = [_resolve(v, blobs, pages) for v in value]
+        return value if all(r is v for r, v in zip(resolved, value)) else resolved
+    return value
+
+
+def _lookup(root: Dict[str, Any], key: str, default: Any,
+            blobs: Optional[BlobStore], pages: Optional[PageFile]) -> Any:
+    """Look up a dotted key, resolving references along the way."""
+    current = root
+    for k in key.split('.'):
+        if k not in current:
+            return default
+        current = current[k]
+        if _is_ref(current, blobs, pages):
+            current = _deref(current, blobs, pages)
+
+    return _resolve(current, blobs, pages)
+
+
+class StateView:
+    """
+    Read-only snapshot of a WorkflowState at one version.
+
+    In thread-safe mode a published version is never modified again, so a
+    view stays consistent however the state changes afterwards. Values
+    returned by a view are shared with the state and must not be modified.
+    """
+    __slots__ = ('version', '_root', '_blobs', '_pages')
+
+    def __init__(self, root: Dict[str, Any], version: int,
+                 blobs: Optional[BlobStore] = None, pages: Optional[PageFile] = None):
+        """
+        Initialize the view.
+
+        Args:
+            root: State dictionary of the version
+            version: Version number, increasing with every published change
+            blobs: Blob store to resolve blob references with
+            pages: Page file to resolve page references with
+        """
+        self.version = version
+        self._root = root
+        self._blobs = blobs
+        self._pages = pages
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value by dotted key, like WorkflowState.get()."""
+        return _lookup(self._root, key, default, self._blobs, self._pages)
+
+    def get_current_stage(self) -> str:
+        """Get the workflow stage of this version."""
+        return self._root["current_stage"]
+
+    def _raw_history(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """Return history_base and the in-memory history window as stored, without resolving the entries."""
+        history = self._root.get("history", [])
+        if _is_ref(history, self._blobs, self._pages):
+            history = _deref(history, self._blobs, self._pages)
+        return self._root.get("history_base", 0), history
+
+    def resolve(self, value: Any) -> Any:
+        """Replace every reference inside a value read from this view with the value it points to."""
+        return _resolve(value, self._blobs, self._pages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the complete state of this version, with references resolved."""
+        return _resolve(self._root, self._blobs, self._pages)
+
 
 class WorkflowState:
     """
     Manages the state of the SDLC workflow, tracking progress and artifacts.
+
+    By default the whole state is rewritten to ``state_file`` on every
+    change. In journaled mode, each change is instead appended as a small
+    delta record to ``<state_file>.journal``, and a compact snapshot
+    (``<state_file>.snapshot``) is written every ``snapshot_every`` deltas,
+    so the cost of a change does not grow with the size of the state.
+    Loading replays the journal records newer than the snapshot.
+
+    Inside ``transaction()``, changes are only applied in memory and are
+    persisted together when the transaction ends, or undone if it fails.
+
+    When ``blob_threshold`` is set, values at least that many bytes long
+    (top-level updates and the fields of history entries) are stored once
+    in a content-addressed blob store next to the state file, and the state
+    only holds references to them. ``get()`` resolves references lazily.
+
+    In paged mode, every time the full state is written (each save by
+    default, each snapshot in journaled mode), large top-level values such
+    as ``code`` and ``design_documents`` and the payloads of history
+    entries are moved to an append-only page file
+    (``<state_file>.pages.<generation>``). The state file then only holds
+    the small index of keys, and paged values are decoded from a memory
+    map of the page file when ``get()`` touches them. The page file is
+    rewritten once most of it holds superseded values.
+
+    A state created with ``for_run()`` belongs to a single workflow run: it
+    lives in that run's own shard of a RunIndex, and the run record tracks
+    the current stage, so concurrent runs never share a state file.
+
+    The state file and snapshots are written with a pluggable codec
+    ("json", the readable default, or the compact binary "msgpack") and
+    the codec is detected when loading, so the format can be switched at
+    any time.
+
+    In thread-safe mode, writers serialize on a lock and never modify a
+    published state in place: each change copies only the dictionaries
+    and lists on its path, shares everything else with the previous
+    version, and then publishes the new root with a single assignment.
+    Readers (``get()``, ``view()``, ``get_full_state()``) never take the
+    lock and always see a complete version; changes made inside a
+    transaction are published together when it commits.
+
+    With ``history_window`` set, only the most recent history entries stay
+    in memory (``state["history"]``). Older entries are moved to an
+    append-only log (``<state_file>.history``), and ``history_base`` counts
+    how many were moved. ``get_history()`` pages through the full history.
+
+    History entries are numbered by their position in the full history.
+    An index from stage name to entry numbers is built on the first query
+    and kept up to date by ``add_to_history()``, so ``history_for()`` and
+    ``last()`` read just the matching entries instead of scanning.
     """
-    def __init__(self, state_file: Optional[str] = None):
+    def __init__(self, state_file: Optional[str] = None,
+                 journaled: bool = False,
+                 snapshot_every: int = 100,
+                 blob_threshold: Optional[int] = None,
+                 paged: bool = False,
+                 page_threshold: int = 4096,
+                 run_id: Optional[str] = None,
+                 run_index: Optional[RunIndex] = None,
+                 codec: str = "json",
+                 thread_safe: bool = False,
+                 history_window: Optional[int] = None):
         """
         Initialize the workflow state.
 
         Args:
             state_file: Optional path to save state to disk
+            journaled: Persist changes as journal deltas plus periodic snapshots
+            snapshot_every: Number of journal deltas between snapshots
+            blob_threshold: Store values of at least this many bytes in the blob store
+            paged: Page large values out to a memory-mapped file when saving
+            page_threshold: Minimum encoded size in bytes of a value to page out
+            run_id: ID of the workflow run this state belongs to
+            run_index: Run index to report stage changes of the run to
+            codec: Codec to write the state file and snapshots with ("json" or "msgpack")
+            thread_safe: Serialize writers and publish copy-on-write versions to lock-free readers
+            history_window: Number of recent history entries to keep in memory
         """
         self.state_file = state_file
+        self.journaled = journaled and state_file is not None
+        self.snapshot_every = snapshot_every
+        self._seq = 0
+        self._journal_size = 0
+        self._journal = None
+        self._pending_ops: Optional[List[tuple]] = None
+        self._undo: List[Callable[[], None]] = []
+        self.blob_threshold = blob_threshold
+        self.blobs = None
+        if blob_threshold is not None and state_file is not None:
+            self.blobs = BlobStore(os.path.join(os.path.dirname(state_file) or ".", "blobs"))
+        self.paged = paged and state_file is not None
+        self.page_threshold = page_threshold
+        self.pages: Optional[PageFile] = None
+        self.run_id = run_id
+        self.run_index = run_index
+        self.codec = get_codec(codec)
+        self.thread_safe = thread_safe
+        self._lock = threading.RLock()
+        self._version = 0
+        self._tx_thread: Optional[int] = None
+        self._stage_index: Optional[Dict[str, List[int]]] = None
+        self._indexed = 0
+        self._index_lock = threading.Lock()
+        self.history_window = history_window
+        self.history_log = None
+        if history_window is not None and state_file is not None:
+            self.history_log = HistoryLog(state_file + ".history")
         self.state = {
             "current_stage": "requirements",
             "requirements": {},
@@ -37,18 +246,419 @@ class WorkflowState:
         }
 
         # Load state from file if it exists
-        if state_file and os.path.exists(state_file):
-            with open(state_file, 'r') as f:
-                self.state = json.load(f)
+        if self.journaled:
+            self._load_journaled()
+        elif state_file and os.path.exists(state_file):
+            self.state = self._open_document(read_file(state_file))
+        self._published = StateView(self.state, self._version, self.blobs, self.pages)
+
+    def _open_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the state held by a loaded state file, opening its page file if it is paged."""
+        if PAGES_KEY not in document:
+            return document
+        self._open_pages(document[PAGES_KEY])
+        return document["state"]
+
+    def _open_pages(self, name: Optional[str]) -> None:
+        """Open the page file with the given name, next to the state file."""
+        if name is not None:
+            self.pages = PageFile(os.path.join(os.path.dirname(self.state_file), name))
+
+    @classmethod
+    def for_run(cls, run_id: Optional[str] = None,
+                runs_dir: str = "storage/runs",
+                **kwargs) -> "WorkflowState":
+        """
+        Open the state shard of a workflow run, registering the run if it is new.
+
+        Args:
+            run_id: ID of the run to resume (a new run is started if not provided)
+            runs_dir: Directory holding the run shards
+            **kwargs: Options passed on to WorkflowState
+
+        Returns:
+            The run's workflow state
+        """
+        run_index = RunIndex(runs_dir)
+        run_id = run_index.create(run_id)["run_id"]
+        return cls(run_index.state_file(run_id), run_id=run_id, run_index=run_index, **kwargs)
+
+    @property
+    def snapshot_file(self) -> str:
+        """Path of the snapshot written in journaled mode."""
+        return self.state_file + ".snapshot"
+
+    @property
+    def journal_file(self) -> str:
+        """Path of the delta journal written in journaled mode."""
+        return self.state_file + ".journal"
+
+    def _load_journaled(self) -> None:
+        """Load the latest snapshot and replay the journal records written after it."""
+        if os.path.exists(self.snapshot_file):
+            snapshot = read_file(self.snapshot_file)
+            self.state = snapshot["state"]
+            self._seq = snapshot["seq"]
+            self._open_pages(snapshot.get(PAGES_KEY))
+        elif os.path.exists(self.state_file):
+            # Start from a state file written in the default mode
+            self.state = self._open_document(read_file(self.state_file))
+
+        if not os.path.exists(self.journal_file):
+            return
+
+        valid_end = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final record from an interrupted write
+                    break
+                valid_end += len(line)
+                if record["seq"] <= self._seq:
+                    continue
+                for op, key, value in record["ops"]:
+                    self._apply(op, key, value)
+                self._seq = record["seq"]
+                self._journal_size += 1
+
+        if valid_end < os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_end)
+
+    def _apply(self, op: str, key: str, value: Any) -> None:
+        """
+        Apply a single change to the in-memory state.
+
+        Args:
+            op: "set" (assign the dotted key), "append" (append to the list at the key)
+                or "spill" (drop the oldest entries of the list at the key)
+            key: Dotted state key
+            value: Value to assign or append, or the number of entries to drop
+        """
+        if op == "spill":
+            # Drop the oldest `value` entries of a list already written to the history log
+            root = dict(self.state) if self.thread_safe else self.state
+            root[key] = root[key][value:]
+            root[f"{key}_base"] = root.get(f"{key}_base", 0) + value
+            self.state = root
+            return
+
+        if self.thread_safe:
+            self._apply_copy(op, key, value)
+            return
+
+        keys = key.split('.')
+        current = self.state
+
+        for k in keys[:-1]:
+            if k not in current:
+                current[k] = {}
+            current = self._materialize(current, k)
+
+        if op == "append":
+            if keys[-1] in current:
+                self._materialize(current, keys[-1]).append(value)
+            else:
+                current[keys[-1]] = [value]
+        else:
+            current[keys[-1]] = value
+
+    def _apply_copy(self, op: str, key: str, value: Any) -> None:
+        """Apply a change by copying only the containers on its path, leaving the old version intact."""
+        keys = key.split('.')
+        root = current = dict(self.state)
+
+        for k in keys[:-1]:
+            child = current[k] if k in current else {}
+            child = self._deref(child) if self._is_ref(child) else dict(child)
+            current[k] = child
+            current = child
+
+        last = keys[-1]
+        if op == "append":
+            items = current.get(last, [])
+            items = self._deref(items) if self._is_ref(items) else list(items)
+            items.append(value)
+            value = items
+        current[last] = value
+        self.state = root
+
+    def _publish(self) -> None:
+        """Make the current state visible to readers as a new version."""
+        self._version += 1
+        self._published = StateView(self.state, self._version, self.blobs, self.pages)
+
+    def _materialize(self, container: Dict[str, Any], key: str) -> Any:
+        """Replace a blob or page reference about to be modified in place with its value."""
+        value = container[key]
+        if self._is_ref(value):
+            value = container[key] = self._deref(value)
+        return value
+
+    def _is_ref(self, value: Any) -> bool:
+        """Check whether a value is a blob or page reference this state can resolve."""
+        return _is_ref(value, self.blobs, self.pages)
+
+    def _deref(self, value: Any) -> Any:
+        """Load the value a blob or page reference points to."""
+        return _deref(value, self.blobs, self.pages)
+
+    def _page_out(self) -> Optional[str]:
+        """
+        Move large values into the page file before the full state is written.
+
+        Returns:
+            Path of a superseded page file to delete once the new state is on disk
+        """
+        # Slots are (history index, key), with an index of None for top-level keys
+        history = self.state.get("history", [])
+        values = {(None, key): value for key, value in self.state.items() if key not in UNPAGED_KEYS}
+        values.update({(i, "data"): entry["data"] for i, entry in enumerate(history) if "data" in entry})
+
+        replacements = {}
+        for slot, value in values.items():
+            if is_page_ref(value) or not isinstance(value, (dict, list, str)):
+                continue
+            data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+            if len(data) < self.page_threshold:
+                continue
+            if self.pages is None:
+                os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+                self._open_pages(os.path.basename(self.state_file) + ".pages.1")
+            replacements[slot] = self.pages.append(data)
+
+        retired = None
+        if self.pages is not None:
+            values.update(replacements)
+            refs = {slot: value for slot, value in values.items() if is_page_ref(value)}
+            live = sum(ref[PAGE_REF_KEY][1] for ref in refs.values())
+            if self.pages.size() > max(2 * live, 1024 * 1024):
+                # Most of the page file is superseded values: copy the live ones to a new generation
+                old = self.pages
+                prefix, generation = old.path.rsplit('.', 1)
+                self.pages = PageFile(f"{prefix}.{int(generation) + 1}")
+                for slot, ref in refs.items():
+                    replacements[slot] = self.pages.append(old.read_bytes(ref))
+                if not self.thread_safe:
+                    # Published views may still read the old file; they close it when released
+                    old.close()
+                retired = old.path
+
+        self._replace_slots(replacements)
+        return retired
+
+    def _replace_slots(self, replacements: Dict[tuple, Any]) -> None:
+        """Store paged-out values, copying the containers involved in thread-safe mode."""
+        if not replacements:
+            return
+        if not self.thread_safe:
+            for (index, key), value in replacements.items():
+                container = self.state if index is None else self.state["history"][index]
+                container[key] = value
+            return
+
+        root = dict(self.state)
+        history = root.get("history")
+        if any(index is not None for index, _ in replacements):
+            history = root["history"] = list(history)
+        for (index, key), value in replacements.items():
+            if index is None:
+                root[key] = value
+            else:
+                history[index] = dict(history[index], **{key: value})
+
+        # The same content in a new representation, so the version stays the same
+        self.state = root
+        self._published = StateView(root, self._version, self.blobs, self.pages)
+
+    def _externalize(self, value: Any) -> Any:
+        """Move a large value into the blob store, returning the reference to keep in the state."""
+        if self.blobs is None or not isinstance(value, (dict, list, str)) or is_blob_ref(value):
+            return value
+        data = BlobStore.encode(value)
+        if len(data) < self.blob_threshold:
+            return value
+        return self.blobs.put(value, data)
+
+    def _undo_for(self, op: str, key: str) -> Callable[[], None]:
+        """Return a callable that reverts the change about to be applied at a key."""
+        if op == "spill":
+            state, base_key = self.state, f"{key}_base"
+            items, base = state[key], state.get(base_key)
+
+            def undo_spill():
+                state[key] = items
+                if base is None:
+                    state.pop(base_key, None)
+                else:
+                    state[base_key] = base
+            return undo_spill
+
+        keys = key.split('.')
+        current = self.state
+
+        for k in keys[:-1]:
+            if k not in current:
+                # The change creates this container, so removing it undoes everything below
+                return lambda parent=current, k=k: parent.pop(k, None)
+            current = self._materialize(current, k)
+
+        last = keys[-1]
+        if last not in current:
+            return lambda: current.pop(last, None)
+        if op == "append":
+            return self._materialize(current, last).pop
+        old_value = current[last]
+        return lambda: current.__setitem__(last, old_value)
+
+    def _change(self, op: str, key: str, value: Any) -> None:
+        """Apply a change and persist it, or queue it when a transaction is open."""
+        with self._lock:
+            if self._pending_ops is not None:
+                if not self.thread_safe:
+                    self._undo.append(self._undo_for(op, key))
+                self._apply(op, key, value)
+                self._pending_ops.append((op, key, value))
+                return
+
+            self._apply(op, key, value)
+            self._publish()
+            self._persist([(op, key, value)])
+
+    def _persist(self, ops: List[tuple]) -> None:
+        """Write applied changes to disk and report a stage change to the run index."""
+        if self.journaled:
+            self._append_journal(ops)
+        else:
+            self._save_state()
+
+        if self.run_index is not None and any(key == "current_stage" for _, key, _ in ops):
+            stage = self.state["current_stage"]
+            self.run_index.update(
+                self.run_id,
+                stage=stage,
+                status="complete" if stage == "complete" else "running"
+            )
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several changes into one write.
+
+        Changes made inside the block are applied in memory right away and
+        persisted once on exit: as a single journal record in journaled
+        mode, otherwise with one atomic rewrite of the state file. If the
+        block raises, every change is undone and nothing is written. Nested
+        transactions join the outermost one.
+
+        The transaction holds the writer lock, so other threads' changes
+        wait until it ends. In thread-safe mode, readers in other threads
+        keep seeing the version from before the transaction until it
+        commits.
+        """
+        with self._lock:
+            if self._pending_ops is not None:
+                yield self
+                return
+
+            self._pending_ops = []
+            self._undo = []
+            base = self.state
+            self._tx_thread = threading.get_ident()
+            try:
+                yield self
+            except BaseException:
+                if self.thread_safe:
+                    self.state = base
+                for undo in reversed(self._undo):
+                    undo()
+                if any(key == "history" for _, key, _ in self._pending_ops):
+                    # The index may cover entries that were just rolled back
+                    with self._index_lock:
+                        self._stage_index = None
+                raise
+            else:
+                if self._pending_ops:
+                    self._publish()
+                    self._persist(self._pending_ops)
+            finally:
+                self._pending_ops = None
+                self._undo = []
+                self._tx_thread = None
+
+    def _append_journal(self, ops: List[tuple]) -> None:
+        """Append one delta record to the journal, snapshotting once enough have accumulated."""
+        self._seq += 1
+        record = json.dumps({"seq": self._seq, "ops": ops}, separators=(',', ':'))
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            self._journal = open(self.journal_file, 'a')
+        self._journal.write(record + "\n")
+        self._journal.flush()
+        self._journal_size += 1
+
+        if self._journal_size >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """Write a compact snapshot of the state and start a new journal (journaled mode only)."""
+        if not self.journaled:
+            return
+        with self._lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        """Write the snapshot; the caller holds the lock."""
+        retired = self._page_out() if self.paged else None
+        snapshot = {"seq": self._seq, "state": self.state}
+        if self.pages is not None:
+            snapshot[PAGES_KEY] = os.path.basename(self.pages.path)
+        write_file(self.snapshot_file, snapshot, self.codec, compact=True)
+        if retired is not None:
+            os.remove(retired)
+
+        # Records up to the snapshot's seq are skipped on load, so a crash here is harmless
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'w')
+        self._journal_size = 0
+
+    def close(self) -> None:
+        """Close the journal and page file handles."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if self.pages is not None:
+                self.pages.close()
+                self.pages = None
+            if self.history_log is not None:
+                self.history_log.close()
+
+    def view(self) -> StateView:
+        """
+        Return a read-only snapshot of the current version without copying it.
+
+        In thread-safe mode this never blocks on writers, and ``version``
+        can be compared between calls to skip unchanged states.
+
+        Returns:
+            View of the current state
+        """
+        if self.thread_safe and self._tx_thread != threading.get_ident():
+            # The root and page file are published together, so a page file swap is never seen half-done
+            return self._published
+        return StateView(self.state, self._version, self.blobs, self.pages)
 
     def get_current_stage(self) -> str:
         """Get the current workflow stage."""
-        return self.state["current_stage"]
+        return self.view().get_current_stage()
 
     def set_stage(self, stage: str) -> None:
         """Set the current workflow stage."""
-        self.state["current_stage"] = stage
-        self._save_state()
+        self._change("set", "current_stage", stage)
 
     def update(self, key: str, value: Any) -> None:
         """
@@ -58,16 +668,7 @@ class WorkflowState:
             key: State key to update
             value: New value
         """
-        keys = key.split('.')
-        current = self.state
-
-        for k in keys[:-1]:
-            if k not in current:
-                current[k] = {}
-            current = current[k]
-
-        current[keys[-1]] = value
-        self._save_state()
+        self._change("set", key, self._externalize(value))
 
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -80,15 +681,7 @@ class WorkflowState:
         Returns:
             The value or default
         """
-        keys = key.split('.')
-        current = self.state
-
-        for k in keys:
-            if k not in current:
-                return default
-            current = current[k]
-
-        return current
+        return self.view().get(key, default)
 
     def add_to_history(self, stage: str, data: Dict[str, Any]) -> None:
         """
@@ -98,23 +691,160 @@ class WorkflowState:
             stage: Stage name
             data: Data to add to history
         """
-        self.state["history"].append({
+        if isinstance(data, dict):
+            data = {k: self._externalize(v) for k, v in data.items()}
+        entry = {
             "stage": stage,
             "data": data
-        })
-        self._save_state()
+        }
+        if self.history_log is None:
+            self._change("append", "history", entry)
+        else:
+            with self.transaction():
+                self._change("append", "history", entry)
+                self._spill_history()
+
+        if self._stage_index is not None:
+            with self._index_lock:
+                self._index_history(self.view())
+
+    def _spill_history(self) -> None:
+        """Move history entries beyond the in-memory window to the history log."""
+        history = self.state["history"]
+        excess = len(history) - self.history_window
+        if excess <= 0:
+            return
+
+        # Paged values are inlined, since the page file only keeps values the state references
+        entries = [_resolve(entry, None, self.pages) for entry in history[:excess]]
+        self.history_log.append(self.state.get("history_base", 0), entries)
+        self._change("spill", "history", excess)
+
+    def _index_history(self, view: StateView) -> Dict[str, List[int]]:
+        """Extend the stage index to cover every history entry in a view. Must hold the index lock."""
+        base, window = view._raw_history()
+        if self._stage_index is None:
+            self._stage_index, self._indexed = {}, 0
+
+        stages = []
+        if self._indexed < base and self.history_log is not None:
+            stages = [entry["stage"] for entry in self.history_log.read(self._indexed, base)]
+        stages.extend(entry["stage"] for entry in window[max(self._indexed - base, 0):])
+
+        for position, stage in enumerate(stages, self._indexed):
+            self._stage_index.setdefault(stage, []).append(position)
+        self._indexed += len(stages)
+        return self._stage_index
+
+    def _stage_positions(self, view: StateView, stage: str) -> List[int]:
+        """Return the positions of a stage's history entries in a view, oldest first."""
+        with self._index_lock:
+            positions = self._index_history(view).get(stage, [])
+            # The index may be ahead of an older view published to this thread
+            base, window = view._raw_history()
+            length = base + len(window)
+            return positions[:bisect.bisect_left(positions, length)]
+
+    def _history_at(self, view: StateView, positions: List[int]) -> List[Dict[str, Any]]:
+        """Read history entries by position, from the history log or the in-memory window, resolving only those."""
+        base, window = view._raw_history()
+
+        entries = []
+        spilled = [position for position in positions if position < base]
+        if spilled and self.history_log is not None:
+            entries = [_resolve(entry, self.blobs, None) for entry in self.history_log.read_at(spilled)]
+        entries.extend(view.resolve(window[position - base]) for position in positions if position >= base)
+        return entries
+
+    def history_for(self, stage: str) -> List[Dict[str, Any]]:
+        """
+        Get every history entry of a stage.
+
+        Args:
+            stage: Stage name
+
+        Returns:
+            The stage's history entries, oldest first
+        """
+        view = self.view()
+        return self._history_at(view, self._stage_positions(view, stage))
+
+    def last(self, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent history entry of a stage.
+
+        Args:
+            stage: Stage name
+
+        Returns:
+            The entry, or None if the stage has no history
+        """
+        view = self.view()
+        entries = self._history_at(view, self._stage_positions(view, stage)[-1:])
+        return entries[0] if entries else None
+
+    def history_range(self, seq_from: int, seq_to: int) -> List[Dict[str, Any]]:
+        """
+        Get the history entries numbered from seq_from up to (not including) seq_to.
+
+        Args:
+            seq_from: Position of the first entry in the full history
+            seq_to: Position after the last entry
+
+        Returns:
+            History entries, oldest first
+        """
+        return self.get_history(seq_from, seq_to - seq_from)
+
+    def history_length(self) -> int:
+        """Return the number of history entries, including those spilled to disk."""
+        base, window = self.view()._raw_history()
+        return base + len(window)
+
+    def get_history(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Read a page of the full history, oldest first.
+
+        Entries still in memory are read from the state, older ones from
+        the history log.
+
+        Args:
+            offset: Index of the first entry to return
+            limit: Maximum number of entries to return
+
+        Returns:
+            History entries, with references resolved
+        """
+        view = self.view()
+        base, window = view._raw_history()
+        stop = min(offset + max(limit, 0), base + len(window))
+
+        entries = []
+        if offset < base and self.history_log is not None:
+            entries = [_resolve(entry, self.blobs, None) for entry in self.history_log.read(offset, min(stop, base))]
+        entries.extend(view.resolve(entry) for entry in window[max(offset - base, 0):max(stop - base, 0)])
+        return entries
 
     def is_complete(self) -> bool:
         """Check if the workflow is complete."""
-        return self.state["current_stage"] == "complete"
+        return self.get_current_stage() == "complete"
 
     def get_full_state(self) -> Dict[str, Any]:
-        """Get the complete state dictionary."""
-        return self.state
+        """
+        Get the complete state dictionary, with blob and page references resolved.
+
+        In thread-safe mode this is the latest published version, which is
+        shared with the state and must not be modified.
+        """
+        return self.view().to_dict()
 
     def _save_state(self) -> None:
-        """Save the state to disk if a state file is specified."""
+        """Save the state to disk if a state file is specified, replacing the file atomically."""
         if self.state_file:
-            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
-            with open(self.state_file, 'w') as f:
-                json.dump(self.state, f, indent=2)
\ No newline at end of file
+            retired = self._page_out() if self.paged else None
+            document = self.state
+            if self.pages is not None:
+                document = {PAGES_KEY: os.path.basename(self.pages.path), "state": self.state}
+            write_file(self.state_file, document, self.codec)
+            if retired is not None:
+                os.remove(retired)
\ No newline at end of file